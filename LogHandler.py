@@ -1,12 +1,16 @@
 from datetime import datetime
-from zipfile import ZipFile
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5 import QtGui
 import dslog2csv
+import dslog_writers
+import dslog_summary
+import log_index
+import log_archive
+import multiprocessing
 import configparser
-import glob
-import csv
+import json
+import time
 import sys
 import os
 
@@ -20,12 +24,19 @@ class LogHandler(QWidget):
 
         self.log_dir = self.config['DEFAULT']['LogLocation']
         self.output_dir = self.config['DEFAULT']['OutputLocation']
+        self.output_format = self.config['DEFAULT'].get('OutputFormat', 'csv')
 
         self.filter = "Both"
 
+        self.index = log_index.LogIndex(self.config['DEFAULT'].get('IndexFile', 'log_index.json'))
         self.log_data = None
         self.update_files_data()
 
+        # picks up logs the Driver Station writes while the window is open
+        self.watcher = LogWatcher(self)
+        self.watcher.changed.connect(self.on_logs_changed)
+        self.watcher.watch(self.log_dir)
+
         self.title = 'DS Log Handler'
         self.setWindowIcon(QtGui.QIcon('icon.png'))
         self.left = 50
@@ -35,10 +46,19 @@ class LogHandler(QWidget):
 
         self.list_view = None
         self.list_model = None
+        self.list_proxy = None
+        self.search_box = None
         self.type_radios = None
+        self.format_box = None
         self.log_row = None
         self.out_row = None
         self.status_line = None
+        self.progress_bar = None
+        self.export_btn = None
+        self.summary_btn = None
+        self.archive_btn = None
+        self.cancel_btn = None
+        self.worker = None
         self.init_ui()
 
     def init_ui(self):
@@ -51,24 +71,59 @@ class LogHandler(QWidget):
         self.type_radios = RadioGroup("Log Type:", "Match", "Practice", "Both")
         self.connect_to_radios(self.type_radios)
 
+        self.format_box = QComboBox()
+        self.format_box.addItems(sorted(dslog_writers.WRITERS))
+        self.format_box.setCurrentText(self.output_format)
+        self.format_box.setToolTip('File format of exported logs. Parquet and Arrow need pyarrow, NPZ needs numpy.')
+        self.format_box.currentTextChanged.connect(self.on_format_changed)
+        format_line = QHBoxLayout()
+        format_line.addWidget(QLabel("Format:"))
+        format_line.addWidget(self.format_box)
+        format_line.addStretch()
+
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search logs")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.on_search_changed)
+
         self.list_view = QListView()
         self.list_view.setSpacing(2)
-        self.list_model = QtGui.QStandardItemModel(self.list_view)
+        # every row is one line, so the view doesn't have to measure them all
+        self.list_view.setUniformItemSizes(True)
+        self.list_model = LogListModel(self.list_view)
+        self.list_proxy = LogFilterProxy(self.list_view)
+        self.list_proxy.setSourceModel(self.list_model)
+        self.list_view.setModel(self.list_proxy)
         self.update_list_view()
 
-        export_btn = QPushButton('Export selected logs')
-        export_btn.setToolTip('Creates CSV copies of selected logs in the output folder.')
-        export_btn.setStyleSheet("color: #28a745")
-        export_btn.clicked.connect(self.convert_files)
+        self.export_btn = QPushButton('Export selected logs')
+        self.export_btn.setToolTip('Creates CSV (or the chosen format) copies of selected logs in the output folder.')
+        self.export_btn.setStyleSheet("color: #28a745")
+        self.export_btn.clicked.connect(self.convert_files)
+
+        self.summary_btn = QPushButton('Summarize selected logs')
+        self.summary_btn.setToolTip('Writes one CSV with summary statistics for each selected log to the output '
+                                    'folder. Needs numpy.')
+        self.summary_btn.clicked.connect(self.summarize_files)
+
+        self.archive_btn = QPushButton('Archive selected logs')
+        self.archive_btn.setToolTip('Moves selected logs into a zip archive.')
+        self.archive_btn.setStyleSheet("color: #dc3545")
+        self.archive_btn.clicked.connect(self.archive_files)
 
-        archive_btn = QPushButton('Archive selected logs')
-        archive_btn.setToolTip('Moves selected logs into a zip archive.')
-        archive_btn.setStyleSheet("color: #dc3545")
-        archive_btn.clicked.connect(self.archive_files)
+        self.cancel_btn = QPushButton('Cancel')
+        self.cancel_btn.setToolTip('Stops the running export or archive.')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_work)
 
         btn_line = QHBoxLayout()
-        btn_line.addWidget(export_btn)
-        btn_line.addWidget(archive_btn)
+        btn_line.addWidget(self.export_btn)
+        btn_line.addWidget(self.summary_btn)
+        btn_line.addWidget(self.archive_btn)
+        btn_line.addWidget(self.cancel_btn)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
 
         self.status_line = QLineEdit()
         self.status_line.setText("Ready.")
@@ -78,128 +133,114 @@ class LogHandler(QWidget):
         layout.addLayout(self.log_row)
         layout.addLayout(self.out_row)
         layout.addLayout(self.type_radios)
+        layout.addLayout(format_line)
+        layout.addWidget(self.search_box)
         layout.addWidget(self.list_view)
         layout.addLayout(btn_line)
+        layout.addWidget(self.progress_bar)
         layout.addWidget(self.status_line)
         self.setLayout(layout)
         self.show()
 
     def update_list_view(self):
-        self.list_model.removeRows(0, self.list_model.rowCount())
-        for log in self.log_data:
-            if self.filter == "Match":
-                if log['is_match']:
-                    self.list_model.appendRow(LogListItem(log['name']))
-            elif self.filter == "Practice":
-                if not log['is_match']:
-                    self.list_model.appendRow(LogListItem(log['name']))
-            elif self.filter == "Both":
-                self.list_model.appendRow(LogListItem(log['name']))
-            self.list_view.setModel(self.list_model)
-
-    def update_files_data(self):
-        log_data = []
-        log_files = [item[len(self.log_dir):] for item in glob.glob(self.log_dir + '*.dslog')]
+        self.list_model.set_logs(self.log_data)
 
-        for log in log_files:
-            try:
-                match_info = dslog2csv.find_match_info(self.log_dir + log[:-6] + '.dsevents')
-                log_data.append({'name': log, 'is_match': match_info is not None})
-            except:
-                pass
+    @pyqtSlot(list)
+    def on_logs_changed(self, names):
+        updates = self.index.update_files(self.log_dir, names)
+        self.list_model.update_logs(updates)
+        self.log_data = self.list_model.logs
 
-        self.log_data = log_data
+    def update_files_data(self):
+        # only new or changed logs get parsed, the rest come from the index
+        self.log_data = self.index.update(self.log_dir)
 
     def get_selected_files(self):
-        log_files = []
-        for index in range(self.list_model.rowCount()):
-            item = self.list_model.item(index)
-            if item.checkState() == 2:
-                log_files.append(item.text())
-        return log_files
+        # logs that are checked but filtered out of the list stay checked, but aren't exported
+        return [log['name'] for log in self.list_model.checked_logs() if self.list_proxy.accepts(log)]
 
     def convert_files(self):
+        if self.worker is not None:
+            return
         self.prep_out_location()
 
-        log_files = self.get_selected_files()
-
-        # CODE BELOW IS REIMPLEMENTED FROM DSLOG2CSV'S MAIN
-        get_match_info = self.filter == "Match"
-
-        col = ['inputfile', ]
-        if get_match_info:
-            col.append('match_info')
-        col.extend(dslog2csv.DSLogParser.OUTPUT_COLUMNS)
-
-        problem_files = 0
-        for in_name in log_files:
-            in_file = self.log_dir + in_name
-            match_info = None
-
-            # this block might crash, check it
-            event_file = dslog2csv.find_event_file(in_file)
-            event_parser = dslog2csv.DSEventParser(event_file)
-
-            if event_file and event_parser.version == 3:
-                try:
-                    match_info = dslog2csv.find_match_info(event_file)
-                except:
-                    self.status_line.setText(in_name + " had bad match info, skipping.")
-                    problem_files += 1
-                    pass
-
-            if get_match_info and not match_info:
-                self.status_line.setText(in_name + " had bad match info, skipping.")
-                problem_files += 1
-                continue
+        in_files = [self.log_dir + in_name for in_name in self.get_selected_files()]
+        incremental = self.config['DEFAULT'].get('IncrementalExport', 'TRUE') != "FALSE"
+        self.start_worker(ExportWorker(in_files, self.output_dir, self.filter == "Match", self.output_format,
+                                       self.config['DEFAULT'].get('ProfileFile'), incremental),
+                          "Exporting")
 
-            outname = self.output_dir + in_name[:-6] + ".csv"
-            outstrm = open(outname, 'w', newline='')
-            outcsv = csv.DictWriter(outstrm, fieldnames=col, extrasaction='ignore')
-            outcsv.writeheader()
+    def summarize_files(self):
+        if self.worker is not None:
+            return
+        self.prep_out_location()
 
-            try:
-                dsparser = dslog2csv.DSLogParser(in_file)
-            except:
-                self.status_line.setText(in_file + " had bad version, skipping.")
-                problem_files += 1
-                continue
-                
-            if dsparser.version != 3:
-                self.status_line.setText(in_file + " had bad version, skipping.")
-                problem_files += 1
-                continue
-                
-            for rec in dsparser.read_records():
-                rec['inputfile'] = in_file
-                rec['match_info'] = match_info
-
-                for i in range(16):
-                    rec['pdp_{}'.format(i)] = rec['pdp_currents'][i]
-
-                outcsv.writerow(rec)
-            dsparser.close()
-            outstrm.close()
-        file_cnt = len(log_files)
-        file_str = str(file_cnt)
-        success = str(file_cnt - problem_files) + "/" + file_str
-        fails = str(problem_files) + "/" + file_str
-        self.status_line.setText("Export complete. Processed " + success + " log files, skipped " + fails + " files.")
+        in_files = [self.log_dir + in_name for in_name in self.get_selected_files()]
+        time_str = datetime.now().strftime('%Y_%m_%d %H_%M_%S')
+        file_name = self.output_dir + time_str + " SUMMARY - " + str(len(in_files)) + " LOG FILES.csv"
+        self.start_worker(SummaryWorker(in_files, file_name, self.filter == "Match"), "Summarizing")
 
     def archive_files(self):
-        self.status_line.setText("Archiving files...")
+        if self.worker is not None:
+            return
+
         log_files = self.get_selected_files()
 
-        time_str = datetime.now().strftime('%Y_%m_%d %H_%M_%S')
-        file_name = self.log_dir + time_str + " ARCHIVE - " + str(len(log_files)) + " LOG FILES.zip"
+        # either keep adding to the same archive, or start a new one each time
+        file_name = self.config['DEFAULT'].get('ArchiveFile')
+        if not file_name:
+            time_str = datetime.now().strftime('%Y_%m_%d %H_%M_%S')
+            file_name = self.log_dir + time_str + " ARCHIVE - " + str(len(log_files)) + " LOG FILES.zip"
+        compression = self.config['DEFAULT'].get('ArchiveCompression', 'deflate')
+        level = self.config['DEFAULT'].getint('ArchiveLevel', log_archive.DEFAULT_LEVEL)
+        self.start_worker(ArchiveWorker(self.log_dir, log_files, file_name, compression, level), "Archiving")
+
+    def start_worker(self, worker, verb):
+        self.worker = worker
+        self.worker.progress.connect(self.on_progress)
+        self.worker.done.connect(self.on_worker_done)
+
+        self.export_btn.setEnabled(False)
+        self.summary_btn.setEnabled(False)
+        self.archive_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.status_line.setText(verb + " files...")
+        self.worker.start()
+
+    def cancel_work(self):
+        if self.worker is not None:
+            self.status_line.setText("Cancelling...")
+            self.cancel_btn.setEnabled(False)
+            self.worker.cancel()
+
+    @pyqtSlot(int, int, float, str)
+    def on_progress(self, done, total, rate, current):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        self.status_line.setText("{}/{} files, {:.0f} records/s: {}".format(done, total, rate, current))
 
-        with ZipFile(file_name, 'w') as z_file:
-            for file in log_files:
-                z_file.write(self.log_dir + file)
-                os.remove(self.log_dir + file)
-        self.status_line.setText("Archived " + str(len(log_files)) + " log files.")
-        self.update_files_data()
-        self.update_list_view()
+    @pyqtSlot(str)
+    def on_worker_done(self, message):
+        refresh = isinstance(self.worker, ArchiveWorker)
+        self.worker.wait()
+        self.worker = None
+
+        self.export_btn.setEnabled(True)
+        self.summary_btn.setEnabled(True)
+        self.archive_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.status_line.setText(message)
+
+        if refresh:
+            self.update_files_data()
+            self.update_list_view()
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(event)
 
     def check_config(self):
         config = configparser.ConfigParser()
@@ -230,7 +271,17 @@ class LogHandler(QWidget):
     @pyqtSlot(str)
     def on_changed(self, string):
         self.filter = string
-        self.update_list_view()
+        self.list_proxy.set_log_type(string)
+
+    @pyqtSlot(str)
+    def on_search_changed(self, string):
+        self.list_proxy.set_search(string)
+
+    @pyqtSlot(str)
+    def on_format_changed(self, string):
+        self.output_format = string
+        self.config.set('DEFAULT', 'OutputFormat', self.output_format)
+        self.write_config(self.config)
 
     def connect_to_radios(self, radio_obj):
         radio_obj.changed.connect(self.on_changed)
@@ -243,15 +294,381 @@ class LogHandler(QWidget):
         self.write_config(self.config)
         self.update_files_data()
         self.update_list_view()
+        self.watcher.watch(self.log_dir)
 
     def connect_to_logs(self, btn_obj):
         btn_obj.folder_change.connect(self.on_folder_changed)
 
 
-class LogListItem(QtGui.QStandardItem):
-    def __init__(self, title):
-        super().__init__(title)
-        self.setCheckable(True)
+class Worker(QThread):
+    """Runs an export or archive off the GUI thread.
+
+    Emits progress(files done, total files, records per second, current file) as it goes and done(status message)
+    at the end, also when work() fails. cancel() can be called from the GUI thread."""
+
+    progress = pyqtSignal(int, int, float, str)
+    done = pyqtSignal(str)
+
+    # start of the status message when work() raises
+    failed_message = "Failed: "
+
+    def __init__(self):
+        super().__init__()
+        # a process-safe event, so the export's worker processes can see it too
+        self.cancel_event = multiprocessing.Event()
+        self.start_time = None
+        self.records = 0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report(self, done, total, records, current):
+        self.records += records
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.records / elapsed if elapsed > 0 else 0.0
+        self.progress.emit(done, total, rate, current)
+
+    def run(self):
+        self.start_time = time.perf_counter()
+        self.records = 0
+        try:
+            message = self.work()
+        except Exception as e:
+            # done has to go out whatever happens, or the buttons stay disabled
+            message = self.failed_message + (str(e) or type(e).__name__)
+        self.done.emit(message)
+
+    def work(self):
+        raise NotImplementedError
+
+
+class ExportWorker(Worker):
+    failed_message = "Export failed: "
+
+    def __init__(self, in_files, output_dir, get_match_info, output_format='csv', profile_file=None,
+                 incremental=True):
+        super().__init__()
+        self.in_files = in_files
+        self.output_dir = output_dir
+        self.get_match_info = get_match_info
+        self.output_format = output_format
+        # where to save the timings of the export as JSON, if anywhere
+        self.profile_file = profile_file
+        # skip the logs which were already exported and haven't changed
+        self.incremental = incremental
+
+    def work(self):
+        problem_files = 0
+        up_to_date = 0
+        done = 0
+        stats = dslog2csv.ConversionStats() if self.profile_file else None
+        results = dslog2csv.convert_files(self.in_files, output_dir=self.output_dir,
+                                          add_match_info=self.get_match_info, matches_only=self.get_match_info,
+                                          jobs=None, cancel_event=self.cancel_event, fmt=self.output_format,
+                                          stats=stats, incremental=self.incremental)
+        for res in results:
+            done += 1
+            in_name = os.path.basename(res.input_file)
+            if res.up_to_date:
+                up_to_date += 1
+                in_name += " is up to date."
+            elif res.error:
+                problem_files += 1
+                if res.error != dslog2csv.CANCELLED:
+                    in_name += " could not be converted, skipping."
+            elif res.output_file is None:
+                problem_files += 1
+                in_name += " had bad match info, skipping."
+            self.report(done, len(self.in_files), res.records, in_name)
+
+        if stats is not None:
+            with open(self.profile_file, 'w') as f:
+                json.dump(stats.as_dict(), f, indent=2)
+
+        file_cnt = len(self.in_files)
+        file_str = str(file_cnt)
+        success = str(file_cnt - problem_files) + "/" + file_str
+        fails = str(problem_files) + "/" + file_str
+        current = ""
+        if up_to_date:
+            current = " (" + str(up_to_date) + " already up to date)"
+        if self.is_cancelled():
+            return "Export cancelled. Processed " + success + " log files" + current + ", skipped " + fails + " files."
+        return "Export complete. Processed " + success + " log files" + current + ", skipped " + fails + " files."
+
+
+class SummaryWorker(Worker):
+    failed_message = "Summary failed: "
+
+    def __init__(self, in_files, file_name, get_match_info):
+        super().__init__()
+        self.in_files = in_files
+        self.file_name = file_name
+        self.get_match_info = get_match_info
+
+    def work(self):
+        summarized = 0
+        done = 0
+        with open(self.file_name, 'w', newline='') as outstrm:
+            results = dslog_summary.summarize_files(self.in_files, outstrm, add_match_info=self.get_match_info,
+                                                    matches_only=self.get_match_info, jobs=None,
+                                                    cancel_event=self.cancel_event)
+            for res in results:
+                done += 1
+                records = 0
+                if res.summary is not None:
+                    summarized += 1
+                    records = res.summary['records']
+                self.report(done, len(self.in_files), records, os.path.basename(res.input_file))
+
+        if summarized == 0:
+            os.remove(self.file_name)
+        message = "Summarized " + str(summarized) + "/" + str(len(self.in_files)) + " log files"
+        if self.is_cancelled():
+            return "Summary cancelled. " + message + "."
+        return message + " into " + os.path.basename(self.file_name) + "."
+
+
+class ArchiveWorker(Worker):
+    failed_message = "Archive failed: "
+
+    def __init__(self, log_dir, log_files, file_name, compression='deflate', level=log_archive.DEFAULT_LEVEL):
+        super().__init__()
+        self.log_dir = log_dir
+        self.log_files = log_files
+        self.file_name = file_name
+        self.compression = compression
+        self.level = level
+        self.archived = 0
+
+    def on_archived(self, path, size):
+        # the event files go in along with the logs, but only the logs are counted
+        if path.endswith('.dslog'):
+            self.archived += 1
+            records = max(0, size - dslog2csv.DSLogParser.HEADER_SIZE) // dslog2csv.DSLogParser.RECORD_SIZE
+            self.report(self.archived, len(self.log_files), records, os.path.basename(path))
+
+    def work(self):
+        paths = log_archive.companion_files([self.log_dir + file for file in self.log_files])
+        res = log_archive.archive_files(self.file_name, paths, self.compression, self.level,
+                                        progress=self.on_archived, cancel_event=self.cancel_event)
+
+        archived = len([path for path in res.archived if path.endswith('.dslog')])
+        message = "Archived " + str(archived) + " log files"
+        if res.bytes_in:
+            message += ", {:.1f} MB to {:.1f} MB".format(res.bytes_in / 1e6, res.bytes_out / 1e6)
+        if res.failed:
+            message += ", " + str(len(res.failed)) + " files could not be archived"
+        if self.is_cancelled():
+            return "Archive cancelled. " + message + "."
+        return message + "."
+
+
+class LogListModel(QAbstractListModel):
+    """The logs from the log index, one row each. The text of a row is only made when the view asks for it,
+    and the checked logs are kept by name, so they stay checked when the list is filtered or reloaded."""
+
+    NameRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logs = []
+        self.checked = set()
+
+    def set_logs(self, logs):
+        self.beginResetModel()
+        self.logs = list(logs)
+        names = {log['name'] for log in self.logs}
+        self.checked &= names
+        self.endResetModel()
+
+    def update_logs(self, updates):
+        """Apply {name: entry or None} from LogIndex.update_files, touching only those rows. New logs go
+        at the end and None removes a log."""
+
+        rows = {log['name']: row for row, log in enumerate(self.logs)}
+        for name, entry in updates.items():
+            row = rows.get(name)
+            if entry is not None and row is not None:
+                self.logs[row] = entry
+                self.dataChanged.emit(self.index(row), self.index(row))
+            elif entry is not None:
+                self.beginInsertRows(QModelIndex(), len(self.logs), len(self.logs))
+                self.logs.append(entry)
+                self.endInsertRows()
+                rows[name] = len(self.logs) - 1
+            elif row is not None:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.logs[row]
+                self.endRemoveRows()
+                self.checked.discard(name)
+                rows = {log['name']: row for row, log in enumerate(self.logs)}
+
+    def checked_logs(self):
+        return [log for log in self.logs if log['name'] in self.checked]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.logs)
+
+    @staticmethod
+    def title(log):
+        minutes, seconds = divmod(int(log['duration']), 60)
+        title = "{}  ({}:{:02d})".format(log['name'], minutes, seconds)
+        if log['match_info']:
+            title += "  " + log['match_info']
+        return title
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        log = self.logs[index.row()]
+        if role == Qt.DisplayRole:
+            return self.title(log)
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if log['name'] in self.checked else Qt.Unchecked
+        if role == Qt.ToolTipRole:
+            start_time = log_index.start_time(log)
+            if start_time is not None:
+                return ("Started " + start_time.astimezone().strftime('%Y-%m-%d %H:%M:%S') +
+                        ", " + str(log['records']) + " records")
+        if role == self.NameRole:
+            return log['name']
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        name = self.logs[index.row()]['name']
+        if value == Qt.Checked:
+            self.checked.add(name)
+        else:
+            self.checked.discard(name)
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+
+class LogWatcher(QObject):
+    """Watches a log folder and emits changed with the names of the logs which were added, modified or
+    removed (a change to a .dsevents file counts for its log).
+
+    The folder is watched for files coming and going, and the logs added since (or still being written
+    when) watching started are watched for changes, as those are the ones the Driver Station is writing.
+    A log being written changes many times a second, so events are collected until there have been none
+    for DEBOUNCE_MS, or for at most MAX_WAIT_MS, and then the sizes and times in the folder listing are
+    compared with the last ones."""
+
+    changed = pyqtSignal(list)
+
+    DEBOUNCE_MS = 1000
+    MAX_WAIT_MS = 5000
+    # logs modified this recently when watching starts may still be being written
+    ACTIVE_SECONDS = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.log_dir = None
+        self.files = {}
+        self.pending_since = None
+
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.on_event)
+        self.fs_watcher.fileChanged.connect(self.on_event)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DEBOUNCE_MS)
+        self.timer.timeout.connect(self.check)
+
+    def watch(self, log_dir):
+        paths = self.fs_watcher.directories() + self.fs_watcher.files()
+        if paths:
+            self.fs_watcher.removePaths(paths)
+        self.timer.stop()
+
+        self.log_dir = log_dir
+        self.files = self.list_files()
+        if not os.path.isdir(log_dir):
+            return
+        self.fs_watcher.addPath(log_dir)
+        recent = (time.time() - self.ACTIVE_SECONDS) * 1e9
+        self.watch_files([name for name, (size, mtime) in self.files.items() if mtime > recent])
+
+    def watch_files(self, names):
+        if names:
+            self.fs_watcher.addPaths([self.log_dir + name for name in names])
+
+    def list_files(self):
+        files = {}
+        try:
+            with os.scandir(self.log_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(('.dslog', '.dsevents')) and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return files
+
+    @pyqtSlot(str)
+    def on_event(self, path):
+        if not self.timer.isActive():
+            self.pending_since = time.monotonic()
+        elif (time.monotonic() - self.pending_since) * 1000 > self.MAX_WAIT_MS:
+            # let it go off, or a log that is being written would never show up
+            return
+        self.timer.start()
+
+    def check(self):
+        files = self.list_files()
+        names = set()
+        for name in files.keys() | self.files.keys():
+            if files.get(name) != self.files.get(name):
+                names.add(name if name.endswith('.dslog') else name[:-len('.dsevents')] + '.dslog')
+        self.watch_files([name for name in files if name not in self.files])
+        self.files = files
+        if names:
+            self.changed.emit(sorted(names))
+
+
+class LogFilterProxy(QSortFilterProxyModel):
+    """Shows the logs of one type ("Match", "Practice" or "Both") whose name or match info contain the search
+    text. Changing the filter only re-checks the rows, nothing is rebuilt. It uses invalidate rather than
+    invalidateFilter, which signals each run of rows that comes or goes and crawls with Match and Practice mixed."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.log_type = "Both"
+        self.search = ""
+
+    def set_log_type(self, log_type):
+        self.log_type = log_type
+        self.invalidate()
+
+    def set_search(self, text):
+        self.search = text.strip().lower()
+        self.invalidate()
+
+    def accepts(self, log):
+        if self.log_type == "Match" and not log['is_match']:
+            return False
+        if self.log_type == "Practice" and log['is_match']:
+            return False
+        if self.search:
+            return self.search in log['name'].lower() or self.search in (log['match_info'] or '').lower()
+        return True
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.accepts(self.sourceModel().logs[source_row])
 
 
 class ButtonRow(QHBoxLayout):
@@ -9,16 +9,85 @@ import sys
 import os
 import os.path
 import struct
+import io
 import csv
-import bitstring
+import json
+import gzip
+import hashlib
 import re
 import datetime
-import math
+import mmap
+import zipfile
+import time
+import shutil
+import tempfile
+import operator
+import itertools
+import collections
+import concurrent.futures
+import dslog_writers
+
+try:
+    import resource
+except ImportError:
+    # not on Windows
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    # numpy is only needed for the batch decoder (DSLogParser.read_columns)
+    numpy = None
 
 MAX_INT64 = 2**63 - 1
+# seconds from the LabVIEW epoch (1904-01-01) of the time stamps to 1970-01-01
+LABVIEW_EPOCH_OFFSET = 2082844800
+UNIX_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
 
+# order of the status bits within the status byte, lowest bit first
+STATUS_COLUMNS = ('robot_disabled', 'robot_auto', 'robot_tele',
+                  'ds_disabled', 'ds_auto', 'ds_tele',
+                  'watchdog', 'brownout')
+
+# the status byte, inverted and unpacked to bits highest bit first, for every possible value
+STATUS_BITS = tuple(tuple(not (status >> (7 - i)) & 1 for i in range(8)) for status in range(256))
+
+# status byte -> status columns
+STATUS_VALUES = tuple(dict(zip(STATUS_COLUMNS, reversed(bits))) for bits in STATUS_BITS)
+
+# robot modes that records can be filtered on, and the status column that marks them
+MODE_COLUMNS = {
+    'auto': 'robot_auto',
+    'tele': 'robot_tele',
+    'disabled': 'robot_disabled',
+}
+
+# how DSLogParser gives the time of a record: datetime, int nanoseconds since 1970, float seconds from the start
+TIME_FORMATS = ('datetime', 'ns', 'seconds')
+
+# lookup tables for the fields of a record which are scaled from a small raw value, used by read_rows
+RowTables = collections.namedtuple('RowTables', ['half', 'loss', 'percent', 'status', 'pdp_id', 'current'])
+
+
+def make_row_tables(convert):
+    return RowTables(
+        half=tuple(convert(v / 2.0) for v in range(256)),
+        loss=tuple(convert(0.04 * v) for v in range(256)),
+        percent=tuple(convert(0.01 * (v / 2.0)) for v in range(256)),
+        status=tuple(tuple(convert(b) for b in reversed(bits)) for bits in STATUS_BITS),
+        pdp_id=tuple(convert(v) for v in range(256)),
+        current=tuple(convert(v / 8.0) for v in range(1024)),
+    )
+
+
+ROW_VALUES = make_row_tables(lambda v: v)
+# the same values as text, the way the csv module writes them
+ROW_TEXT = make_row_tables(str)
+
+
+def read_raw_timestamp(strm):
+    """The seconds and fraction of a second of a time stamp, as the two ints they are stored as, or None"""
 
-def read_timestamp(strm):
     # Time stamp: int64, uint64
     b1 = strm.read(8)
     b2 = strm.read(8)
@@ -26,13 +95,133 @@ def read_timestamp(strm):
         return None
     sec = struct.unpack('>q', b1)[0]
     millisec = struct.unpack('>Q', b2)[0]
+    return sec, millisec
+
 
+def timestamp_datetime(sec, millisec):
     # for now, ignore
     dt = datetime.datetime(1904, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
     dt += datetime.timedelta(seconds=(sec + float(millisec) / MAX_INT64))
     return dt
 
 
+def timestamp_ns(sec, millisec):
+    """Nanoseconds since 1970 of a time stamp, exactly, where timestamp_datetime is rounded to the microsecond"""
+
+    return (sec - LABVIEW_EPOCH_OFFSET) * 1000000000 + millisec * 1000000000 // MAX_INT64
+
+
+def read_timestamp(strm):
+    raw = read_raw_timestamp(strm)
+    if raw is None:
+        return None
+    return timestamp_datetime(*raw)
+
+
+def split_archive_path(path):
+    """Split a path to a file inside a zip archive, like 'logs.zip/name.dslog', into the archive and the name
+    of the member. Other paths come back as (path, None)."""
+
+    if os.path.exists(path):
+        return path, None
+
+    head = path
+    member = []
+    while True:
+        head, tail = os.path.split(head)
+        if not tail:
+            return path, None
+        member.insert(0, tail)
+        if head.lower().endswith('.zip') and os.path.isfile(head):
+            return head, '/'.join(member)
+
+
+def open_input(input_file):
+    """Open a log for reading. Returns the stream, and whether it is ours to close.
+
+    input_file can be a path (including a file in a zip archive, see split_archive_path), bytes, or a
+    binary file-like object, which is read from where it is."""
+
+    if isinstance(input_file, (bytes, bytearray, memoryview)):
+        return io.BytesIO(input_file), True
+    if not isinstance(input_file, (str, os.PathLike)):
+        return input_file, False
+
+    archive, member = split_archive_path(os.fspath(input_file))
+    if member is None:
+        return open(archive, 'rb'), True
+    # the member keeps the archive file open until it is closed
+    with zipfile.ZipFile(archive) as zf:
+        return zf.open(member), True
+
+
+def input_exists(path):
+    archive, member = split_archive_path(path)
+    if member is None:
+        return os.path.exists(path)
+    with zipfile.ZipFile(archive) as zf:
+        return member in zf.NameToInfo
+
+
+def input_stat(path):
+    """Size and modification time (in ns) of a file, or of a file in an archive, or (None, None) if it's missing.
+    Files in an archive have the modification time of the archive."""
+
+    try:
+        archive, member = split_archive_path(path)
+        st = os.stat(archive)
+        if member is None:
+            return st.st_size, st.st_mtime_ns
+        with zipfile.ZipFile(archive) as zf:
+            return zf.getinfo(member).file_size, st.st_mtime_ns
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None, None
+
+
+def read_input(input_file):
+    """All the bytes of a log, see open_input"""
+
+    if isinstance(input_file, (bytes, bytearray, memoryview)):
+        return input_file
+    strm, owned = open_input(input_file)
+    try:
+        return strm.read()
+    finally:
+        if owned:
+            strm.close()
+
+
+def load_entries(file_name, version):
+    """The entries of a JSON file written by save_entries, or {} if it's missing, unreadable or another version"""
+
+    try:
+        with open(file_name, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == version:
+            return data['entries']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}
+
+
+def save_entries(file_name, version, entries):
+    """Save entries to a JSON file along with the version of their format"""
+
+    # write then rename, so a crash can't leave a half written file
+    tmp_file = file_name + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': version, 'entries': entries}, f)
+    os.replace(tmp_file, file_name)
+    return
+
+
+def archive_logs(file_name):
+    """Paths (see split_archive_path) of the DSLog files in a zip archive"""
+
+    with zipfile.ZipFile(file_name) as zf:
+        return [os.path.join(file_name, name) for name in zf.namelist() if name.lower().endswith('.dslog')]
+
+
 class DSLogParser:
     OUTPUT_COLUMNS = [
         'time', 'round_trip_time', 'packet_loss', 'voltage', 'rio_cpu',
@@ -48,54 +237,439 @@ class DSLogParser:
         # 'pdp_resistance', 'pdp_voltage', 'pdp_temp'
     ]
 
-    def __init__(self, input_file):
-        self.strm = open(input_file, 'rb')
+    HEADER_SIZE = 20
+    RECORD_SIZE = 35
+    RECORD_SPACING = 0.020  # seconds
+    RECORD_SPACING_NS = 20000000
+    # of the status byte in a record, see parse_data_v3
+    STATUS_OFFSET = 5
+
+    DATA_V3 = struct.Struct('>BBHBBBBH')
+    # PDP id, then three 64-bit words of packed currents (the last one also has R, V and T)
+    PDP_V3 = struct.Struct('>BQQQ')
+    UINT8 = struct.Struct('>B')
+    UINT16 = struct.Struct('>H')
+    # a whole record: the data fields, status as an int, then the PDP fields
+    RECORD_V3 = struct.Struct('>BBHBBBBHBQQQ')
+
+    # records per read for read_rows
+    ROWS_PER_READ = 1024
+
+    # OUTPUT_COLUMNS from here on come from the PDP part of the record
+    FIRST_PDP_COLUMN = 16
 
-        self.record_time_offset = datetime.timedelta(seconds=0.020)
-        self.curr_time = None
+    def __init__(self, input_file, time_format='datetime'):
+        """input_file is a path, bytes or a binary stream, see open_input.
+
+        time_format (one of TIME_FORMATS) is how the time of each record is given: 'datetime' for a datetime
+        (UTC), 'ns' for int nanoseconds since 1970 or 'seconds' for float seconds from the start of the log.
+        The numbers are cheaper to make and to write out than datetimes. In numpy columns the times are
+        datetime64[us], int64 or float64."""
+
+        if time_format not in TIME_FORMATS:
+            raise Exception("Unknown time format {}".format(time_format))
+        self.time_format = time_format
+
+        self.strm, self.owns_strm = open_input(input_file)
+
+        self.record_time_offset = datetime.timedelta(seconds=self.RECORD_SPACING)
+        self.start_time = None
+        self.start_us = None
+        self.start_ns = None
+        # index of the next record, which the times are worked out from
+        self.record_num = 0
 
         self.version = None
         self.read_header()
         return
 
     def close(self):
-        self.strm.close()
+        if self.owns_strm:
+            self.strm.close()
         return
 
-    def read_records(self):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def read_records(self, columns=None, start=None, end=None, mode=None):
+        """Yield a dict for each record.
+
+        Only the records from start to end (see seek_window) in robot mode mode (see MODE_COLUMNS) are read.
+        If none of columns are PDP columns, the PDP data is not decoded."""
+
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        count = self.seek_window(start, end)
+        want_pdp = self.wants_pdp(columns)
+        # skip the records where this (inverted) status bit is set, before decoding them
+        mode_bit = 1 << STATUS_COLUMNS.index(MODE_COLUMNS[mode]) if mode else 0
+
+        n = 0
+        while count is None or n < count:
+            rec_bytes = self.read_record_bytes()
+            if rec_bytes is None:
+                break
+            n += 1
+            if rec_bytes[self.STATUS_OFFSET] & mode_bit:
+                self.record_num += 1
+                continue
+            yield self.decode_record_v3(rec_bytes, want_pdp)
+        return
+
+    @classmethod
+    def wants_pdp(cls, columns):
+        if columns is None:
+            return True
+        unknown = set(columns) - set(cls.OUTPUT_COLUMNS)
+        if unknown:
+            raise Exception("Unknown columns {}".format(', '.join(sorted(unknown))))
+        return any(name in cls.OUTPUT_COLUMNS[cls.FIRST_PDP_COLUMN:] for name in columns)
+
+    def time_index(self, when):
+        """Index of the first record at or after when (a datetime, or seconds from the start of the log)"""
+
+        if isinstance(when, datetime.datetime):
+            delta = when - self.start_time
+        else:
+            delta = datetime.timedelta(seconds=when)
+
+        # ceiling division
+        return max(-(-delta // self.record_time_offset), 0)
+
+    def seek_record(self, index):
+        self.strm.seek(self.HEADER_SIZE + index * self.RECORD_SIZE)
+        self.record_num = index
+        return
+
+    def seek_window(self, start=None, end=None):
+        """Jump straight to the first record at or after start, as records are a fixed size and spacing.
+
+        Returns the number of records before end, or None for no end."""
+
+        if start is None:
+            first = (self.strm.tell() - self.HEADER_SIZE) // self.RECORD_SIZE
+        else:
+            first = self.time_index(start)
+            self.seek_record(first)
+
+        if end is None:
+            return None
+        return max(self.time_index(end) - first, 0)
+
+    def read_rows(self, text=False, columns=None, start=None, end=None, mode=None):
+        """Like read_records, but yields tuples in OUTPUT_COLUMNS order instead of dicts, reading many records at once.
+
+        With text=True every value comes already formatted, exactly as str() and the csv module would write it.
+        Only columns (still in OUTPUT_COLUMNS order) are returned, and the PDP data is skipped if none of them need it.
+        start, end and mode work as for read_records."""
+
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        count = self.seek_window(start, end)
+        want_pdp = self.wants_pdp(columns)
+        project = None
+        if columns is not None:
+            indices = [i for i, name in enumerate(self.OUTPUT_COLUMNS) if name in columns]
+            if len(indices) == 1:
+                project = lambda row, i=indices[0]: (row[i], )
+            else:
+                project = operator.itemgetter(*indices)
+        # skip the records where this (inverted) status bit is set
+        mode_bit = 1 << STATUS_COLUMNS.index(MODE_COLUMNS[mode]) if mode else 0
+
+        half, loss, percent, status_row, pdp_id_row, current = ROW_TEXT if text else ROW_VALUES
+        current_value = ROW_VALUES.current
+        # for the fields without a table
+        convert = str if text else float
+        while count is None or count > 0:
+            to_read = self.ROWS_PER_READ if count is None else min(self.ROWS_PER_READ, count)
+            block = self.strm.read(to_read * self.RECORD_SIZE)
+            nrec, extra = divmod(len(block), self.RECORD_SIZE)
+            self.check_truncated(extra)
+            if extra:
+                block = block[:nrec * self.RECORD_SIZE]
+
+            times = self.time_strings(nrec) if text else self.times(nrec)
+            for (rtt, packet_loss, volt, cpu, status, can, wifi, bw, pdp_id, w0, w1, w2), t in \
+                    zip(self.RECORD_V3.iter_unpack(block), times):
+                if status & mode_bit:
+                    continue
+
+                row = (t, half[rtt], loss[packet_loss], convert(volt / 256.0), percent[cpu]) + status_row[status] + \
+                    (percent[can], half[wifi], convert(bw / 256.0))
+                if not want_pdp:
+                    yield row if project is None else project(row)
+                    continue
+
+                # currents 0 to 15, see parse_pdp_v3
+                c0 = (w2 >> 24) & 0x3FF
+                c1 = (w2 >> 34) & 0x3FF
+                c2 = (w2 >> 44) & 0x3FF
+                c3 = (w2 >> 54) & 0x3FF
+                c4 = (w1 >> 4) & 0x3FF
+                c5 = (w1 >> 14) & 0x3FF
+                c6 = (w1 >> 24) & 0x3FF
+                c7 = (w1 >> 34) & 0x3FF
+                c8 = (w1 >> 44) & 0x3FF
+                c9 = (w1 >> 54) & 0x3FF
+                c10 = (w0 >> 4) & 0x3FF
+                c11 = (w0 >> 14) & 0x3FF
+                c12 = (w0 >> 24) & 0x3FF
+                c13 = (w0 >> 34) & 0x3FF
+                c14 = (w0 >> 44) & 0x3FF
+                c15 = (w0 >> 54) & 0x3FF
+
+                # added up in order, like parse_pdp_v3
+                total_curr = 0.0 + current_value[c0] + current_value[c1] + current_value[c2] + current_value[c3] + \
+                    current_value[c4] + current_value[c5] + current_value[c6] + current_value[c7] + \
+                    current_value[c8] + current_value[c9] + current_value[c10] + current_value[c11] + \
+                    current_value[c12] + current_value[c13] + current_value[c14] + current_value[c15]
+
+                row += (pdp_id_row[pdp_id],
+                        current[c0], current[c1], current[c2], current[c3], current[c4], current[c5], current[c6],
+                        current[c7], current[c8], current[c9], current[c10], current[c11], current[c12], current[c13],
+                        current[c14], current[c15], convert(total_curr))
+                yield row if project is None else project(row)
+
+            self.record_num += nrec
+            if count is not None:
+                count -= nrec
+            if nrec < to_read:
+                break
+        return
+
+    def times(self, count):
+        """Times of the next count records"""
+
+        if self.time_format == 'ns':
+            first = self.record_time(self.record_num)
+            return list(range(first, first + count * self.RECORD_SPACING_NS, self.RECORD_SPACING_NS))
+        if self.time_format == 'seconds':
+            first = self.record_num
+            return [i * self.RECORD_SPACING for i in range(first, first + count)]
+        return [self.curr_time + i * self.record_time_offset for i in range(count)]
+
+    def time_strings(self, count):
+        """str() of the times of the next count records, without making a datetime for each of them"""
+
+        if self.time_format != 'datetime':
+            return [str(t) for t in self.times(count)]
+        base = self.curr_time.replace(microsecond=0)
+        start_us = self.curr_time.microsecond
+        step_us = self.record_time_offset // datetime.timedelta(microseconds=1)
+
+        res = []
+        last_sec = None
+        for i in range(count):
+            sec, usec = divmod(start_us + i * step_us, 1000000)
+            if sec != last_sec:
+                # 'YYYY-MM-DD HH:MM:SS' and the UTC offset, if any
+                whole = str(base + datetime.timedelta(seconds=sec))
+                head, tail = whole[:19], whole[19:]
+                last_sec = sec
+            if usec:
+                res.append('{}.{:06d}{}'.format(head, usec, tail))
+            else:
+                res.append(head + tail)
+        return res
+
+    def follow_records(self, poll_interval=0.05, stop=None):
+        """Like read_records, but at the end of the file wait for the Driver Station to write more.
+
+        Only complete records are returned. While waiting, stop() is called (if given) and following ends
+        when it returns True."""
+
         if self.version != 3:
             raise Exception("Unknown file version number {}".format(self.version))
 
+        fileno = self.strm.fileno()
         while True:
-            r = self.read_record_v3()
-            if r is None:
+            available = (os.fstat(fileno).st_size - self.strm.tell()) // self.RECORD_SIZE
+            if available <= 0:
+                if stop is not None and stop():
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            for _ in range(available):
+                yield self.read_record_v3()
+        return
+
+    def read_columns(self, count=None):
+        """Decode the remaining records (at most count) in one pass. Requires numpy.
+
+        Returns a dict of numpy arrays with the same values as parse_data_v3 and parse_pdp_v3,
+        plus 'time' as datetime64[us] (UTC). 'pdp_currents' is an (N, 16) array."""
+
+        if numpy is None:
+            raise Exception("numpy is required to decode records in batches")
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        if count is None:
+            data = self.strm.read()
+        else:
+            data = self.strm.read(count * self.RECORD_SIZE)
+        nrec, extra = divmod(len(data), self.RECORD_SIZE)
+        self.check_truncated(extra)
+
+        res = self.parse_block_v3(data, nrec)
+        res['time'] = self.time_column(self.record_num, nrec)
+        self.record_num += nrec
+        return res
+
+    def read_batches(self, size, columns=None, start=None, end=None, mode=None):
+        """Yield RecordBatches of up to size records, as numpy columns. Requires numpy.
+
+        This is for working through a lot of records in memory that doesn't grow with the log: the read buffer
+        and the columns are allocated once and refilled for every batch, so a batch is only good until the next
+        one is read. Only columns are decoded (the PDP data not at all if none of them need it), and start,
+        end and mode work as for read_records; records of other modes are dropped from each batch, so with mode
+        the batches can be smaller than size."""
+
+        if numpy is None:
+            raise Exception("numpy is required to decode records in batches")
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        count = self.seek_window(start, end)
+        want_pdp = self.wants_pdp(columns)
+        batch = RecordBatch(size, columns, self.time_format)
+        buf = bytearray(size * self.RECORD_SIZE)
+        view = memoryview(buf)
+        mode_column = MODE_COLUMNS[mode] if mode else None
+        mode_bit = 1 << STATUS_COLUMNS.index(mode_column) if mode else 0
+        time_base, time_step = self.time_scale()
+
+        while count is None or count > 0:
+            to_read = size if count is None else min(size, count)
+            nbytes = self.read_into(view[:to_read * self.RECORD_SIZE])
+            nrec, extra = divmod(nbytes, self.RECORD_SIZE)
+            self.check_truncated(extra)
+            if nrec == 0:
+                break
+
+            raw = numpy.frombuffer(buf, dtype=RECORD_DTYPE_V3, count=nrec)
+            batch.fill(raw, self.record_num, time_base, time_step, want_pdp)
+            if mode_bit:
+                # the status bits are inverted
+                batch.select((raw['status'] & mode_bit) == 0)
+            self.record_num += nrec
+            if count is not None:
+                count -= nrec
+
+            if len(batch):
+                yield batch
+            if nrec < to_read:
                 break
-            yield r
         return
 
+    def read_into(self, buf):
+        """Fill a writable buffer from the stream, returning the number of bytes read (less only at the end)"""
+
+        readinto = getattr(self.strm, 'readinto', None)
+        if readinto is None:
+            data = self.strm.read(len(buf))
+            buf[:len(data)] = data
+            return len(data)
+
+        total = 0
+        while total < len(buf):
+            n = readinto(buf[total:])
+            if not n:
+                break
+            total += n
+        return total
+
     def read_header(self):
         self.version = struct.unpack('>i', self.strm.read(4))[0]
         # Removed version check to move it up a level.
         # if self.version != 3:
         #    raise Exception("Unknown file version number {}".format(self.version))
 
-        self.curr_time = read_timestamp(self.strm)
+        raw = read_raw_timestamp(self.strm)
+        if raw is not None:
+            self.start_time = timestamp_datetime(*raw)
+            # the datetime64 times are whole microseconds, the same as the datetimes
+            self.start_us = (self.start_time - UNIX_EPOCH) // datetime.timedelta(microseconds=1)
+            self.start_ns = timestamp_ns(*raw)
+        self.record_num = 0
         return
 
-    def read_record_v3(self):
-        data_bytes = self.strm.read(10)
-        if not data_bytes or len(data_bytes) < 10:
+    @property
+    def curr_time(self):
+        """Time of the next record, as a datetime, or None if the log has no header"""
+
+        if self.start_time is None:
+            return None
+        return self.start_time + self.record_num * self.record_time_offset
+
+    def record_time(self, index):
+        """Time of record index, in time_format. Worked out from the start time, so it can't drift."""
+
+        if self.time_format == 'ns':
+            return self.start_ns + index * self.RECORD_SPACING_NS
+        if self.time_format == 'seconds':
+            return index * self.RECORD_SPACING
+        return self.start_time + index * self.record_time_offset
+
+    def time_scale(self):
+        """(base, step) with the time of record i as base + i * step, in the units of the numpy time column"""
+
+        if self.time_format == 'ns':
+            return self.start_ns, self.RECORD_SPACING_NS
+        if self.time_format == 'seconds':
+            return 0.0, self.RECORD_SPACING
+        return self.start_us, self.record_time_offset // datetime.timedelta(microseconds=1)
+
+    def time_column(self, index, count):
+        """numpy array of the times of count records from record index, see time_scale"""
+
+        base, step = self.time_scale()
+        res = numpy.arange(index, index + count, dtype=numpy.int64) * step + base
+        if self.time_format == 'datetime':
+            return res.view('datetime64[us]')
+        return res
+
+    def read_record_v3(self, want_pdp=True):
+        rec_bytes = self.read_record_bytes()
+        if rec_bytes is None:
             return None
-        pdp_bytes = self.strm.read(25)
-        if not pdp_bytes or len(pdp_bytes) < 25:
+        return self.decode_record_v3(rec_bytes, want_pdp)
+
+    def read_record_bytes(self):
+        """The bytes of the next record, or None at the end of the file"""
+
+        rec_bytes = self.strm.read(self.RECORD_SIZE)
+        if len(rec_bytes) < self.RECORD_SIZE:
             # should not happen!!
-            print('ERROR: no data for PDP. Unexpected end of file. Quitting', file=sys.stderr)
+            self.check_truncated(len(rec_bytes))
             return None
+        return rec_bytes
+
+    @staticmethod
+    def check_truncated(extra):
+        """Print the error for a last record cut short to extra bytes, if it has its data but not all of its
+        PDP data. Shared by all the read paths, so they report it the same way."""
+
+        if extra >= 10:
+            print('ERROR: no data for PDP. Unexpected end of file. Quitting', file=sys.stderr)
+        return
 
-        res = {'time': self.curr_time}
-        res.update(self.parse_data_v3(data_bytes))
-        res.update(self.parse_pdp_v3(pdp_bytes))
-        self.curr_time += self.record_time_offset
+    def decode_record_v3(self, rec_bytes, want_pdp=True):
+        """The dict for the record in rec_bytes, which is the next one"""
+
+        res = {'time': self.record_time(self.record_num)}
+        res.update(self.parse_data_v3(rec_bytes))
+        if want_pdp:
+            res.update(self.parse_pdp_v3(rec_bytes, 10))
+        self.record_num += 1
         return res
 
     @staticmethod
@@ -106,21 +680,19 @@ class DSLogParser:
     def unpack_bits(raw_value):
         """Unpack and invert the bits in a byte"""
 
-        status_bits = bitstring.Bits(bytes=raw_value)
-        # invert them all
-        return [not b for b in status_bits]
+        return list(STATUS_BITS[raw_value[0]])
 
-    @staticmethod
-    def uint_from_bytes(bytes_data, offset, size_in_bits):
+    @classmethod
+    def uint_from_bytes(cls, bytes_data, offset, size_in_bits):
         """Pull out an unsigned int from an array of bytes, with arbitrary bit start and length"""
 
-        first_byte = math.floor(offset / 8)
-        num_bytes = math.ceil(size_in_bits / 8)
+        first_byte = offset // 8
+        num_bytes = (size_in_bits + 7) // 8
 
         if num_bytes == 1:
-            uint = struct.unpack_from('>B', bytes_data, first_byte)[0]
+            uint = cls.UINT8.unpack_from(bytes_data, first_byte)[0]
         elif num_bytes == 2:
-            uint = struct.unpack_from('>H', bytes_data, first_byte)[0]
+            uint = cls.UINT16.unpack_from(bytes_data, first_byte)[0]
         else:
             # not needed here, and general case is harder
             raise Exception('not supported')
@@ -131,51 +703,44 @@ class DSLogParser:
 
         return (uint & (0xFFFF >> left_bitshift)) >> right_bitshift
 
-    def parse_data_v3(self, data_bytes):
-        raw_values = struct.unpack('>BBHBcBBH', data_bytes)
-        status_bits = self.unpack_bits(raw_values[4])
-        # print('bits', self.record_num, raw_values[4], int.from_bytes(raw_values[4], byteorder='big'), status_bits)
+    def parse_data_v3(self, data_bytes, offset=0):
+        rtt, loss, volt, cpu, status, can, wifi, bw = self.DATA_V3.unpack_from(data_bytes, offset)
 
         res = {
-            'round_trip_time': self.shifted_float(raw_values[0], 1),
-            'packet_loss': 0.04 * raw_values[1],             # not shifted
-            'voltage': self.shifted_float(raw_values[2], 8),
-            'rio_cpu': 0.01 * self.shifted_float(raw_values[3], 1),
-            'can_usage': 0.01 * self.shifted_float(raw_values[5], 1),
-            'wifi_db': self.shifted_float(raw_values[6], 1),
-            'bandwidth': self.shifted_float(raw_values[7], 8),
-
-            'robot_disabled': status_bits[7],
-            'robot_auto': status_bits[6],
-            'robot_tele': status_bits[5],
-            'ds_disabled': status_bits[4],
-            'ds_auto': status_bits[3],
-            'ds_tele': status_bits[2],
-            'watchdog': status_bits[1],
-            'brownout': status_bits[0],
+            'round_trip_time': rtt / 2.0,
+            'packet_loss': 0.04 * loss,             # not shifted
+            'voltage': volt / 256.0,
+            'rio_cpu': 0.01 * (cpu / 2.0),
+            'can_usage': 0.01 * (can / 2.0),
+            'wifi_db': wifi / 2.0,
+            'bandwidth': bw / 256.0,
         }
+        res.update(STATUS_VALUES[status])
 
         return res
 
-    def parse_pdp_v3(self, pdp_bytes):
+    def parse_pdp_v3(self, pdp_bytes, offset=0):
         # from CD post https://www.chiefdelphi.com/forums/showpost.php?p=1556451&postcount=11
         # pdp_offsets = (8, 18, 28, 38, 52, 62, 72, 82, 92, 102, 116, 126, 136, 146, 156, 166)
 
         # from DSLog-Reader
         # these make more sense in terms of defining a packing scheme, so stick with them
         # looks like this is a 64-bit int holding 6 10-bit numbers and they ignore the extra 4 bits
-        pdp_offsets = (8, 18, 28, 38, 48, 58,
-                       72, 82, 92, 102, 112, 122,
-                       136, 146, 156, 166)
-
-        vals = []
-        for offset in pdp_offsets:
-            vals.append(self.shifted_float(self.uint_from_bytes(pdp_bytes, offset, 10), 3))
+        # i.e. bit offsets (8, 18, 28, 38, 48, 58, 72, 82, 92, 102, 112, 122, 136, 146, 156, 166)
+        pdp_id, w0, w1, w2 = self.PDP_V3.unpack_from(pdp_bytes, offset)
 
-        # values are 15 through 0, so reverse the list
+        # values are 15 through 0, so list them from the end of the last word
         # note: DSLog-Reader did not reverse these. Don't know who to believe.
-        vals.reverse()
-
+        vals = [
+            ((w2 >> 24) & 0x3FF) / 8.0, ((w2 >> 34) & 0x3FF) / 8.0, ((w2 >> 44) & 0x3FF) / 8.0,
+            ((w2 >> 54) & 0x3FF) / 8.0,
+            ((w1 >> 4) & 0x3FF) / 8.0, ((w1 >> 14) & 0x3FF) / 8.0, ((w1 >> 24) & 0x3FF) / 8.0,
+            ((w1 >> 34) & 0x3FF) / 8.0, ((w1 >> 44) & 0x3FF) / 8.0, ((w1 >> 54) & 0x3FF) / 8.0,
+            ((w0 >> 4) & 0x3FF) / 8.0, ((w0 >> 14) & 0x3FF) / 8.0, ((w0 >> 24) & 0x3FF) / 8.0,
+            ((w0 >> 34) & 0x3FF) / 8.0, ((w0 >> 44) & 0x3FF) / 8.0, ((w0 >> 54) & 0x3FF) / 8.0,
+        ]
+
+        # add up in order (not sum(), which may compensate) to get the same rounding as always
         total_curr = 0.0
         for curr in vals:
             total_curr += curr
@@ -183,27 +748,370 @@ class DSLogParser:
         # the scaling on R, V and T are almost certainly not correct
         # need to find a reference for those values
         res = {
-            'pdp_id': self.uint_from_bytes(pdp_bytes, 0, 8),
+            'pdp_id': pdp_id,
             'pdp_currents': vals,
-            'pdp_resistance': self.uint_from_bytes(pdp_bytes, 176, 8),
-            'pdp_voltage': self.uint_from_bytes(pdp_bytes, 184, 8),
-            'pdp_temp': self.uint_from_bytes(pdp_bytes, 192, 8),
+            'pdp_resistance': (w2 >> 16) & 0xFF,
+            'pdp_voltage': (w2 >> 8) & 0xFF,
+            'pdp_temp': w2 & 0xFF,
             'pdp_total_current': total_curr,
         }
 
         return res
 
+    @classmethod
+    def parse_block_v3(cls, data, count=None):
+        """Decode count consecutive 35 byte records from a bytes-like object into numpy columns"""
+
+        if count is None:
+            count = len(data) // cls.RECORD_SIZE
+        raw = numpy.frombuffer(data, dtype=RECORD_DTYPE_V3, count=count)
+
+        res = {
+            'round_trip_time': raw['round_trip_time'] / 2.0,
+            'packet_loss': 0.04 * raw['packet_loss'],
+            'voltage': raw['voltage'] / 2.0**8,
+            'rio_cpu': 0.01 * (raw['rio_cpu'] / 2.0),
+            'can_usage': 0.01 * (raw['can_usage'] / 2.0),
+            'wifi_db': raw['wifi_db'] / 2.0,
+            'bandwidth': raw['bandwidth'] / 2.0**8,
+        }
+
+        # the status bits are inverted
+        status = raw['status']
+        for bit, name in enumerate(STATUS_COLUMNS):
+            res[name] = (status & (1 << bit)) == 0
+
+        # each 64-bit word holds 6 (or 4) 10-bit currents, highest bits first, channel 15 first
+        currents = numpy.empty((count, 16), dtype=numpy.float64)
+        for word_num, nvals in enumerate((6, 6, 4)):
+            word = raw['pdp_word{}'.format(word_num)].astype(numpy.uint64)
+            for i in range(nvals):
+                shift = numpy.uint64(54 - 10 * i)
+                channel = 15 - (6 * word_num + i)
+                currents[:, channel] = (word >> shift) & numpy.uint64(0x3FF)
+        currents /= 2.0**3
+
+        # sum in channel order so the result matches parse_pdp_v3 exactly
+        total_curr = numpy.zeros(count, dtype=numpy.float64)
+        for channel in range(16):
+            total_curr += currents[:, channel]
+
+        last_word = raw['pdp_word2']
+        res.update({
+            'pdp_id': raw['pdp_id'].astype(numpy.int64),
+            'pdp_currents': currents,
+            'pdp_resistance': ((last_word >> 16) & 0xFF).astype(numpy.int64),
+            'pdp_voltage': ((last_word >> 8) & 0xFF).astype(numpy.int64),
+            'pdp_temp': (last_word & 0xFF).astype(numpy.int64),
+            'pdp_total_current': total_curr,
+        })
+        for i in range(16):
+            res['pdp_{}'.format(i)] = currents[:, i]
+
+        return res
+
+
+if numpy is not None:
+    # one v3 record: the 10 data bytes (see parse_data_v3) then the 25 PDP bytes (see parse_pdp_v3)
+    RECORD_DTYPE_V3 = numpy.dtype([
+        ('round_trip_time', 'u1'),
+        ('packet_loss', 'u1'),
+        ('voltage', '>u2'),
+        ('rio_cpu', 'u1'),
+        ('status', 'u1'),
+        ('can_usage', 'u1'),
+        ('wifi_db', 'u1'),
+        ('bandwidth', '>u2'),
+        ('pdp_id', 'u1'),
+        ('pdp_word0', '>u8'),
+        ('pdp_word1', '>u8'),
+        ('pdp_word2', '>u8'),
+    ])
+
+
+class RecordBatch:
+    """Records from DSLogParser.read_batches.
+
+    columns has a numpy array for each of the OUTPUT_COLUMNS that was asked for, plus 'pdp_currents' as an
+    (N, 16) array when there is PDP data, with 'time' as for read_columns in the parser's time_format.
+    The arrays are views of buffers which are reused for the next batch, so copy what has to be kept.
+    Indexing or iterating gives Records, for when rows are easier to work with than columns."""
+
+    def __init__(self, size, columns=None, time_format='datetime'):
+        names = DSLogParser.OUTPUT_COLUMNS if columns is None else \
+            [name for name in DSLogParser.OUTPUT_COLUMNS if name in columns]
+        self.size = size
+        self.count = 0
+        self.names = names
+        self.time_format = time_format
+
+        self.buffers = {}
+        for name in names:
+            if name in STATUS_COLUMNS:
+                self.buffers[name] = numpy.empty(size, dtype=bool)
+            elif name == 'time':
+                dtype = numpy.float64 if time_format == 'seconds' else numpy.int64
+                self.buffers[name] = numpy.empty(size, dtype=dtype)
+            elif name == 'pdp_id':
+                self.buffers[name] = numpy.empty(size, dtype=numpy.int64)
+            elif not name.startswith('pdp_') or name == 'pdp_total_current':
+                self.buffers[name] = numpy.empty(size, dtype=numpy.float64)
+        # the currents are all worked out for the total, and the pdp_N columns are views of them
+        self.currents = numpy.empty((size, 16), dtype=numpy.float64)
+        self.total = numpy.empty(size, dtype=numpy.float64)
+        # scratch space for the decoding
+        self.steps = numpy.arange(size, dtype=numpy.int64)
+        self.scratch = numpy.empty(size, dtype=numpy.uint64)
+        self.status = numpy.empty(size, dtype=numpy.uint8)
+
+        self.columns = {}
+        self.pdp = False
+        return
+
+    def fill(self, raw, first_index, time_base, time_step, want_pdp):
+        """Decode raw (RECORD_DTYPE_V3 records) into the buffers, with the same values as parse_block_v3.
+        The first record is record first_index of the log, see DSLogParser.time_scale for the times."""
+
+        n = len(raw)
+        buffers = self.buffers
+        scales = (('round_trip_time', 2.0), ('voltage', 2.0**8), ('wifi_db', 2.0), ('bandwidth', 2.0**8))
+        for name, scale in scales:
+            if name in buffers:
+                numpy.divide(raw[name], scale, out=buffers[name][:n])
+        if 'packet_loss' in buffers:
+            numpy.multiply(0.04, raw['packet_loss'], out=buffers['packet_loss'][:n])
+        for name in ('rio_cpu', 'can_usage'):
+            if name in buffers:
+                out = buffers[name][:n]
+                numpy.divide(raw[name], 2.0, out=out)
+                numpy.multiply(0.01, out, out=out)
+
+        # the status bits are inverted
+        status = self.status[:n]
+        for bit, name in enumerate(STATUS_COLUMNS):
+            if name in buffers:
+                numpy.bitwise_and(raw['status'], 1 << bit, out=status)
+                numpy.equal(status, 0, out=buffers[name][:n])
+
+        if 'time' in buffers:
+            out = buffers['time'][:n]
+            numpy.add(self.steps[:n], first_index, out=out)
+            out *= time_step
+            out += time_base
+
+        self.pdp = want_pdp
+        if want_pdp:
+            if 'pdp_id' in buffers:
+                buffers['pdp_id'][:n] = raw['pdp_id']
+            currents = self.currents[:n]
+            scratch = self.scratch[:n]
+            for word_num, nvals in enumerate((6, 6, 4)):
+                word = raw['pdp_word{}'.format(word_num)]
+                for i in range(nvals):
+                    numpy.right_shift(word, numpy.uint64(54 - 10 * i), out=scratch)
+                    numpy.bitwise_and(scratch, numpy.uint64(0x3FF), out=scratch)
+                    numpy.divide(scratch, 2.0**3, out=currents[:, 15 - (6 * word_num + i)])
+            # in channel order, like parse_pdp_v3
+            total = self.total[:n]
+            total.fill(0.0)
+            for channel in range(16):
+                total += currents[:, channel]
+
+        self.set_count(n)
+        return
+
+    def select(self, keep):
+        """Keep only the records where keep is True"""
+
+        n = int(numpy.count_nonzero(keep))
+        keep = keep[:self.count]
+        for name, buf in self.buffers.items():
+            buf[:n] = buf[:self.count][keep]
+        if self.pdp:
+            self.currents[:n] = self.currents[:self.count][keep]
+            self.total[:n] = self.total[:self.count][keep]
+        self.set_count(n)
+        return
+
+    def set_count(self, n):
+        self.count = n
+        columns = {}
+        for name in self.names:
+            if name == 'time' and self.time_format == 'datetime':
+                columns[name] = self.buffers[name][:n].view('datetime64[us]')
+            elif name in self.buffers:
+                columns[name] = self.buffers[name][:n]
+            elif name == 'pdp_total_current':
+                columns[name] = self.total[:n]
+            elif self.pdp:
+                columns[name] = self.currents[:n, int(name[4:])]
+        if self.pdp:
+            columns['pdp_currents'] = self.currents[:n]
+            if 'pdp_total_current' in self.names:
+                columns['pdp_total_current'] = self.total[:n]
+        self.columns = columns
+        return
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("record index out of range")
+        return Record(self, index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield Record(self, index)
+        return
+
+
+class Record:
+    """One record of a RecordBatch, with its columns as attributes (record.voltage and so on), as plain Python
+    values. It reads from the batch, so it is only good until the next batch is read."""
+
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+        return
+
+    def __getattr__(self, name):
+        try:
+            column = self.batch.columns[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = column[self.index].item()
+        if name == 'time' and self.batch.time_format == 'datetime':
+            return value.replace(tzinfo=datetime.timezone.utc)
+        return value
+
+    def values(self):
+        """The values in OUTPUT_COLUMNS order, like a row of DSLogParser.read_rows"""
+
+        return tuple(getattr(self, name) for name in self.batch.names if name in self.batch.columns)
+
+
+class DSLogMap(DSLogParser):
+    """Random access to the records of a DSLog file through a memory map.
+
+    Records have a fixed size and spacing, so record i starts at byte HEADER_SIZE + i * RECORD_SIZE
+    and has the time start_time + i * 20ms. Supports len(), indexing and slicing (returning
+    the same dicts as read_records), and raw()/columns() for zero-copy access to the bytes.
+
+    Logs in memory are used as they are, and other streams than plain files (e.g. files in a zip archive)
+    are read into memory."""
+
+    def __init__(self, input_file, time_format='datetime'):
+        super().__init__(input_file, time_format)
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        self.map = None
+        if isinstance(input_file, (bytes, bytearray, memoryview)):
+            self.view = memoryview(input_file)
+        elif isinstance(self.strm, io.BufferedReader):
+            size = os.fstat(self.strm.fileno()).st_size
+            # can't map an empty range
+            self.view = memoryview(b'')
+            if size > self.HEADER_SIZE:
+                self.map = mmap.mmap(self.strm.fileno(), 0, access=mmap.ACCESS_READ)
+                self.view = memoryview(self.map)
+        else:
+            self.strm.seek(0)
+            self.view = memoryview(self.strm.read())
+        self.num_records = max(0, (len(self.view) - self.HEADER_SIZE) // self.RECORD_SIZE)
+        return
+
+    def close(self):
+        """Unmap the file. The memoryviews from raw() must have been released first, otherwise this raises
+        and the map stays open and usable."""
+
+        self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # put things back as they were rather than leave it half closed
+                self.view = memoryview(self.map)
+                raise Exception("Release the raw() views of the log before closing it")
+        super().close()
+        return
+
+    def __len__(self):
+        return self.num_records
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.record(i) for i in range(*key.indices(self.num_records))]
+
+        if key < 0:
+            key += self.num_records
+        if key < 0 or key >= self.num_records:
+            raise IndexError('record index out of range')
+        return self.record(key)
+
+    def record(self, index):
+        offset = self.HEADER_SIZE + index * self.RECORD_SIZE
+
+        res = {'time': self.record_time(index)}
+        res.update(self.parse_data_v3(self.view, offset))
+        res.update(self.parse_pdp_v3(self.view, offset + 10))
+        return res
+
+    def raw(self, key=slice(None)):
+        """Memoryview (no copy) of the bytes of a contiguous range of records.
+        Release it (or use it in a with block) before closing the map."""
+
+        start, stop, step = key.indices(self.num_records)
+        if step != 1:
+            raise Exception('raw access needs a contiguous range of records')
+        stop = max(start, stop)
+        return self.view[self.HEADER_SIZE + start * self.RECORD_SIZE:self.HEADER_SIZE + stop * self.RECORD_SIZE]
+
+    def columns(self, key=slice(None)):
+        """Decode a contiguous range of records into numpy columns, like read_columns"""
+
+        if numpy is None:
+            raise Exception("numpy is required to decode records in batches")
+
+        start = key.indices(self.num_records)[0]
+        res = self.parse_block_v3(self.raw(key))
+        res['time'] = self.time_column(start, len(res['voltage']))
+        return res
+
+    def index_of(self, when):
+        """Index of the first record at or after when (a datetime, or seconds from the start of the log)"""
+
+        return min(self.time_index(when), self.num_records)
+
+    def time_slice(self, start=None, end=None):
+        """Slice of the records with start <= time < end. None leaves that side open."""
+
+        first = 0 if start is None else self.index_of(start)
+        last = self.num_records if end is None else self.index_of(end)
+        return slice(first, max(first, last))
+
+    def slice_time(self, start=None, end=None):
+        return self[self.time_slice(start, end)]
+
 
 class DSEventParser:
     def __init__(self, input_file):
-        self.strm = open(input_file, 'rb')
+        """input_file is a path, bytes or a binary stream, see open_input"""
+
+        self.strm, self.owns_strm = open_input(input_file)
 
         self.version = None
         self.read_header()
         return
 
     def close(self):
-        self.strm.close()
+        if self.owns_strm:
+            self.strm.close()
         return
 
     def read_records(self):
@@ -217,6 +1125,33 @@ class DSEventParser:
             yield r
         return
 
+    def follow_records(self, poll_interval=0.05, stop=None):
+        """Like read_records, but at the end of the file wait for the Driver Station to write more.
+
+        Only complete records are returned. While waiting, stop() is called (if given) and following ends
+        when it returns True."""
+
+        if self.version != 3:
+            raise Exception("Unknown file version number {}".format(self.version))
+
+        fileno = self.strm.fileno()
+        while True:
+            # a record is a timestamp, the message length and then the message
+            pos = self.strm.tell()
+            size = os.fstat(fileno).st_size
+            if size - pos >= 20:
+                self.strm.seek(pos + 16)
+                msg_len = struct.unpack('>i', self.strm.read(4))[0]
+                self.strm.seek(pos)
+                if size - pos >= 20 + msg_len:
+                    yield self.read_record_v3()
+                    continue
+
+            if stop is not None and stop():
+                break
+            time.sleep(poll_interval)
+        return
+
     def read_header(self):
         self.version = struct.unpack('>i', self.strm.read(4))[0]
         # Removed version check to move up a level
@@ -230,48 +1165,882 @@ class DSEventParser:
         if time is None:
             return None
 
-        msg_len = struct.unpack('>i', self.strm.read(4))[0]
-        msg = struct.unpack('%ds' % msg_len, self.strm.read(msg_len))[0]
-        msg = msg.decode('ascii')
+        len_bytes = self.strm.read(4)
+        if len(len_bytes) < 4:
+            return None
+        msg_len = struct.unpack('>i', len_bytes)[0]
+        msg = self.strm.read(msg_len)
+        if len(msg) < msg_len:
+            # cut off part way through
+            return None
+        # the Driver Station sometimes writes bytes which are not ASCII
+        msg = msg.decode('utf-8', errors='replace')
 
         return time, msg
 
 
+FMS_CONNECTED_MARKER = b'FMS Connected:'
+FMS_CONNECTED_RE = re.compile(r'FMS Connected:\s+(?P<info>.*)\s*$')
+
+
 def find_match_info(filename):
-    rdr = DSEventParser(filename)
-    for time, msg in rdr.read_records():
-        m = re.match(r'FMS Connected:\s+(?P<info>.*)\s*$', msg)
-        if m:
-            rdr.close()
-            return m.group('info')
-    rdr.close()
+    """Return the match info from the 'FMS Connected:' event of an event file, or None for practice logs.
+
+    filename can also be anything open_input takes. Plain files are memory mapped rather than read."""
+
+    if isinstance(filename, (str, os.PathLike)) and split_archive_path(os.fspath(filename))[1] is None:
+        with open(filename, 'rb') as strm:
+            size = os.fstat(strm.fileno()).st_size
+            if size < 4:
+                raise Exception("Event file is too short")
+            with mmap.mmap(strm.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return scan_match_info(data)
+    return scan_match_info(bytes(read_input(filename)))
+
+
+def scan_match_info(data):
+    """find_match_info on the bytes of an event file.
+
+    Rather than decoding every event, this searches the raw data for the marker and then walks the
+    record lengths to check the hit is at the start of a message. Only that message gets decoded."""
+
+    if len(data) < 4:
+        raise Exception("Event file is too short")
+    version = struct.unpack_from('>i', data, 0)[0]
+    if version != 3:
+        raise Exception("Unknown file version number {}".format(version))
+
+    # records are a 16 byte timestamp, then the length of the message and the message
+    offset = 20
+    pos = data.find(FMS_CONNECTED_MARKER, offset)
+    while pos >= 0:
+        while offset + 20 < pos:
+            msg_len = struct.unpack_from('>i', data, offset + 16)[0]
+            if msg_len < 0:
+                raise Exception("Bad event message length {}".format(msg_len))
+            offset += 20 + msg_len
+
+        if offset + 20 == pos:
+            msg_len = struct.unpack_from('>i', data, offset + 16)[0]
+            m = FMS_CONNECTED_RE.match(data[pos:pos + msg_len].decode('ascii', errors='replace'))
+            if m:
+                return m.group('info')
+
+        pos = data.find(FMS_CONNECTED_MARKER, pos + 1)
     return None
 
 
 def find_event_file(filename):
+    """The .dsevents file next to a .dslog file, in the same archive for files in an archive"""
+
     evtname = os.path.splitext(filename)[0] + '.dsevents'
-    if os.path.exists(evtname):
+    if input_exists(evtname):
         return evtname
     return None
 
 
+ConversionResult = collections.namedtuple('ConversionResult', ['input_file', 'output_file', 'records', 'error',
+                                                               'stats', 'up_to_date', 'source'])
+ConversionResult.__new__.__defaults__ = (None, False, None)
+ConversionResult.__doc__ = """Outcome of converting one DSLog file.
+
+output_file is None if the file was skipped for having no match info, error is None on success.
+stats are the timings of the file (see ConversionStats) when profiling, otherwise None.
+up_to_date is True if an incremental export skipped the file, as its output was already current.
+source is what the ExportManifest records about the log, taken before it was converted, for incremental exports."""
+
+# ConversionResult.error for files that were cancelled before or during their conversion
+CANCELLED = 'cancelled'
+
+# set in the worker processes by init_worker, so a conversion can be stopped part way through a file
+_cancel_event = None
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class TimedStream:
+    """Wraps a file to add up the time spent reading it, and the bytes read"""
+
+    def __init__(self, strm, stages):
+        self.strm = strm
+        self.stages = stages
+        self.bytes_read = 0
+        return
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.strm.read(size)
+        self.stages['read'] += time.perf_counter() - start
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buf):
+        start = time.perf_counter()
+        n = self.strm.readinto(buf)
+        self.stages['read'] += time.perf_counter() - start
+        self.bytes_read += n or 0
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.strm, name)
+
+
+def peak_memory():
+    """Peak memory (resident set size, in bytes) of this process so far, or None if unknown"""
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class ConversionStats:
+    """Where the time goes when converting files, from convert_files(stats=...) or --profile.
+
+    The stages are looking for match info, reading the log file, decoding and formatting its records,
+    writing them out (including the disk writes), closing the output and, for a single output,
+    copying the parts into it. Worker processes time their own files, so with several jobs the stages
+    add up to more than the wall time."""
+
+    STAGES = ('match_info', 'read', 'decode', 'write', 'close', 'merge')
+
+    def __init__(self):
+        self.stages = dict.fromkeys(self.STAGES, 0.0)
+        self.files = []
+        self.records = 0
+        self.bytes = 0
+        self.peak_memory = peak_memory()
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+        return
+
+    @classmethod
+    def new_file(cls, in_file):
+        return {'file': in_file, 'seconds': 0.0, 'records': 0, 'bytes': 0, 'peak_memory': None,
+                'stages': dict.fromkeys(cls.STAGES, 0.0)}
+
+    def add_file(self, file_stats):
+        self.files.append(file_stats)
+        for stage, seconds in file_stats['stages'].items():
+            self.stages[stage] += seconds
+        self.records += file_stats['records']
+        self.bytes += file_stats['bytes']
+        if file_stats['peak_memory'] is not None:
+            self.peak_memory = max(self.peak_memory or 0, file_stats['peak_memory'])
+        return
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+        own_peak = peak_memory()
+        if own_peak is not None:
+            self.peak_memory = max(self.peak_memory or 0, own_peak)
+        return
+
+    def as_dict(self):
+        wall_time = self.wall_time or 1e-9
+        return {
+            'wall_time': self.wall_time,
+            'records': self.records,
+            'bytes': self.bytes,
+            'records_per_s': self.records / wall_time,
+            'mb_per_s': self.bytes / wall_time / 1e6,
+            'peak_memory': self.peak_memory,
+            'stages': self.stages,
+            'files': self.files,
+        }
+
+    def summary(self):
+        res = self.as_dict()
+        lines = ['{} files, {} records, {:.1f} MB in {:.3f}s: {:.0f} records/s, {:.1f} MB/s'.format(
+            len(self.files), res['records'], res['bytes'] / 1e6, res['wall_time'], res['records_per_s'],
+            res['mb_per_s'])]
+        if res['peak_memory'] is not None:
+            lines.append('peak memory {:.1f} MB'.format(res['peak_memory'] / 1e6))
+
+        total = sum(self.stages.values()) or 1e-9
+        for stage in self.STAGES:
+            lines.append('  {:<12}{:9.3f}s {:5.1f}%'.format(stage, self.stages[stage],
+                                                              100 * self.stages[stage] / total))
+        for f in self.files:
+            lines.append('  {}: {} records in {:.3f}s'.format(f['file'], f['records'], f['seconds']))
+        return '\n'.join(lines)
+
+
+def init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+    return
+
+
+def worker_cancel_event(cancel_event=None):
+    """cancel_event, or if that is None the one init_worker set up in this worker process"""
+
+    return _cancel_event if cancel_event is None else cancel_event
+
+
+RecordFilter = collections.namedtuple('RecordFilter', ['columns', 'start', 'end', 'mode'])
+RecordFilter.__new__.__defaults__ = (None, None, None, None)
+RecordFilter.__doc__ = """Which part of each DSLog file to convert, see DSLogParser.read_rows. None means all of it."""
+
+
+def output_columns(add_match_info=False, columns=None, merge_events=None):
+    col = ['inputfile', ]
+    if add_match_info:
+        col.append('match_info')
+    if columns is None:
+        col.extend(DSLogParser.OUTPUT_COLUMNS)
+    else:
+        DSLogParser.wants_pdp(columns)  # check the names
+        col.extend(name for name in DSLogParser.OUTPUT_COLUMNS if name in columns)
+    if merge_events:
+        col.extend(EVENT_COLUMNS)
+    return col
+
+
+# columns added by merged_rows
+EVENT_COLUMNS = ('event_type', 'event')
+
+# ways merged_rows can merge in the events
+MERGE_EVENTS = ('nearest', 'rows')
+
+
+def csv_quote(value):
+    """Format text as the csv module would, for rows that are joined up directly"""
+
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def merged_rows(dsparser, event_file, how='nearest', record_filter=None):
+    """dsparser.read_rows(text=True) with the events of event_file merged in, reading both files once, in step.
+
+    how='nearest' puts each event in the EVENT_COLUMNS of the record nearest to it in time (joined by ' | ' if there
+    are several), how='rows' gives each event a row of its own, in time order among the records, with only the time
+    and event columns filled in. Events outside the time window of record_filter are left out, and with a mode
+    filter events go to the nearest record in that mode. Like the Driver Station writes them, the events have to be
+    in time order."""
+
+    # not at the top, dslog_events uses this module
+    import dslog_events
+
+    if how not in MERGE_EVENTS:
+        raise Exception("Unknown way to merge events {}".format(how))
+    if record_filter is None:
+        record_filter = RecordFilter()
+
+    # the records are numbered from the start of the log, and the events placed in between by time
+    first = 0 if record_filter.start is None else dsparser.time_index(record_filter.start)
+    last = None if record_filter.end is None else dsparser.time_index(record_filter.end)
+    start_time = dsparser.start_time
+    spacing = dsparser.record_time_offset
+
+    def events():
+        if event_file is None:
+            return
+        rdr = DSEventParser(event_file)
+        try:
+            for t, text in rdr.read_records():
+                offset = (t - start_time) / spacing
+                if offset < first or (last is not None and offset >= last):
+                    continue
+                yield offset, dslog_events.decode_event(t, text)
+        finally:
+            rdr.close()
+        return
+
+    project = None
+    if record_filter.columns is not None:
+        indices = [i for i, name in enumerate(DSLogParser.OUTPUT_COLUMNS) if name in record_filter.columns]
+        project = operator.itemgetter(*indices)
+    else:
+        indices = range(len(DSLogParser.OUTPUT_COLUMNS))
+    mode_index = DSLogParser.OUTPUT_COLUMNS.index(MODE_COLUMNS[record_filter.mode]) if record_filter.mode else None
+
+    def record_row(row, evs=()):
+        if project is not None:
+            row = project(row) if len(indices) > 1 else (row[indices[0]], )
+        if not evs:
+            return row + ('', '')
+        return row + (' | '.join(e.type for e in evs), csv_quote(' | '.join(e.message for e in evs)))
+
+    def event_row(e):
+        return tuple(str(e.time) if i == 0 else '' for i in indices) + (e.type, csv_quote(e.message))
+
+    rows = dsparser.read_rows(text=True, start=record_filter.start, end=record_filter.end)
+    pending_events = events()
+    offset, ev = next(pending_events, (None, None))
+    if how == 'rows':
+        for i, row in enumerate(rows, first):
+            while ev is not None and offset < i:
+                yield event_row(ev)
+                offset, ev = next(pending_events, (None, None))
+            if mode_index is None or row[mode_index] == 'True':
+                yield record_row(row)
+        while ev is not None:
+            yield event_row(ev)
+            offset, ev = next(pending_events, (None, None))
+        return
+
+    # a record is held back until the next one is known, as events up to half way to it are its nearest
+    held = None
+    held_index = None
+    for i, row in enumerate(rows, first):
+        if mode_index is not None and row[mode_index] != 'True':
+            continue
+        if held is not None:
+            attached = []
+            while ev is not None and offset <= (held_index + i) / 2:
+                attached.append(ev)
+                offset, ev = next(pending_events, (None, None))
+            yield record_row(held, attached)
+        held = row
+        held_index = i
+    if held is not None:
+        attached = []
+        while ev is not None:
+            attached.append(ev)
+            offset, ev = next(pending_events, (None, None))
+        yield record_row(held, attached)
+    pending_events.close()
+    return
+
+
+def csv_row(rec, in_file, match_info=None):
+    """Add the extra CSV columns to a record from read_records"""
+
+    rec['inputfile'] = in_file
+    rec['match_info'] = match_info
+
+    # unpack the PDP currents to go into columns more easily
+    for i in range(16):
+        rec['pdp_{}'.format(i)] = rec['pdp_currents'][i]
+    return rec
+
+
+def wait_for_file(filename, min_size, poll_interval=0.05):
+    """Wait until a file exists and has at least min_size bytes, e.g. the header of a log that was just created"""
+
+    while not os.path.exists(filename) or os.path.getsize(filename) < min_size:
+        time.sleep(poll_interval)
+    return
+
+
+# records per chunk when writing columnar formats
+COLUMN_CHUNK_SIZE = 16384
+
+# rows per write when writing CSV, and how often cancelling is checked
+ROW_CHUNK_SIZE = 1000
+
+
+def write_log(in_file, writer, match_info=None, cancel_event=None, record_filter=None, file_stats=None,
+              merge_events=None, resampler=None, time_format='datetime'):
+    """Write the records of a DSLog file with one of the dslog_writers. Returns the number of rows.
+
+    record_filter (a RecordFilter) picks the records and columns, the writer must have been made with the
+    same columns. Raises ConversionCancelled if cancel_event gets set.
+    If file_stats (from ConversionStats.new_file) is given, the time of each stage is added to it.
+    merge_events (one of MERGE_EVENTS) merges in the events of the log's event file, see merged_rows.
+    With a dslog_resample.Resampler, one row is written per window instead of one per record.
+    time_format is the DSLogParser time format of the time column."""
+
+    if record_filter is None:
+        record_filter = RecordFilter()
+    if merge_events and writer.columnar:
+        raise Exception("Events can only be merged into CSV output")
+    if merge_events and resampler is not None:
+        raise Exception("Events can't be merged into resampled output")
+    if merge_events and time_format != 'datetime':
+        raise Exception("Events can only be merged with datetime times")
+    # resampling works on the numpy columns, whatever the output
+    use_columns = writer.columnar or resampler is not None
+
+    dsparser = DSLogParser(in_file, time_format)
+    if file_stats is not None:
+        stages = file_stats['stages']
+        dsparser.strm = TimedStream(dsparser.strm, stages)
+        # decoding is the time getting each chunk less the reads
+        reads_before = stages['read']
+        fetch_time = 0.0
+    count = 0
+    try:
+        # records left in the time window, for the columnar formats
+        remaining = None
+        if use_columns:
+            remaining = dsparser.seek_window(record_filter.start, record_filter.end)
+            mode_column = MODE_COLUMNS[record_filter.mode] if record_filter.mode else None
+            index = (dsparser.strm.tell() - dsparser.HEADER_SIZE) // dsparser.RECORD_SIZE
+            constants = {'inputfile': in_file, 'match_info': match_info}
+
+        while True:
+            if file_stats is not None:
+                chunk_start = time.perf_counter()
+
+            if use_columns:
+                chunk_size = COLUMN_CHUNK_SIZE if remaining is None else min(COLUMN_CHUNK_SIZE, remaining)
+                cols = dsparser.read_columns(chunk_size)
+                num_read = len(cols['time'])
+                if remaining is not None:
+                    remaining -= num_read
+                indices = numpy.arange(index, index + num_read)
+                index += num_read
+                if mode_column:
+                    keep = cols[mode_column]
+                    cols = {name: values[keep] for name, values in cols.items()}
+                    indices = indices[keep]
+
+                if resampler is not None:
+                    cols = resampler.add(cols, indices)
+                    if num_read < chunk_size or remaining == 0:
+                        last = resampler.finish()
+                        if cols is None:
+                            cols = last
+                        elif last is not None:
+                            cols = {name: numpy.concatenate((cols[name], last[name])) for name in cols}
+
+                if file_stats is not None:
+                    write_start = time.perf_counter()
+                    fetch_time += write_start - chunk_start
+                num_records = 0
+                if cols is not None:
+                    num_records = len(cols['time'])
+                    if writer.columnar:
+                        cols.update(constants)
+                        writer.write_columns(cols)
+                    elif num_records:
+                        writer.write_rows(resampler.text_rows(cols, writer.columns[len(writer.constant_columns):]),
+                                          constants)
+            else:
+                if count == 0 and merge_events:
+                    rows = merged_rows(dsparser, find_event_file(in_file), merge_events, record_filter)
+                elif count == 0:
+                    rows = dsparser.read_rows(text=True, columns=record_filter.columns, start=record_filter.start,
+                                              end=record_filter.end, mode=record_filter.mode)
+                chunk = list(itertools.islice(rows, ROW_CHUNK_SIZE))
+                if file_stats is not None:
+                    write_start = time.perf_counter()
+                    fetch_time += write_start - chunk_start
+                writer.write_rows(chunk, {'inputfile': in_file, 'match_info': match_info})
+                num_records = num_read = len(chunk)
+                chunk_size = ROW_CHUNK_SIZE
+
+            if file_stats is not None:
+                stages['write'] += time.perf_counter() - write_start
+
+            count += num_records
+            if num_read < chunk_size or remaining == 0:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled(CANCELLED)
+    finally:
+        if file_stats is not None:
+            stages['decode'] += fetch_time - (stages['read'] - reads_before)
+            file_stats['bytes'] += dsparser.strm.bytes_read
+            file_stats['records'] += count
+        dsparser.close()
+    return count
+
+
+def convert_file(in_file, out_file, add_match_info=False, matches_only=False, header=True, cancel_event=None,
+                 fmt='csv', compression=None, record_filter=None, profile=False, merge_events=None, resample=None,
+                 time_format='datetime', manifest_source=False):
+    """Convert one DSLog file to a CSV file, or another of the dslog_writers.WRITERS formats.
+
+    This is what runs in the worker processes, so problems are returned in the result instead of raised.
+    With profile, the result has the timings of the file in stats. resample is the (window, agg, status_agg)
+    of a dslog_resample.Resampler, to write a row per window. time_format is one of TIME_FORMATS.
+    With manifest_source, the result has the source of the log for the ExportManifest, hash and all.
+    The output is written under a temporary name and renamed when it is complete, so out_file is never
+    half written."""
+
+    cancel_event = worker_cancel_event(cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return ConversionResult(in_file, None, 0, CANCELLED)
+
+    part_file = out_file + '.part'
+    file_stats = None
+    started = None
+    if profile:
+        file_stats = ConversionStats.new_file(in_file)
+        started = time.perf_counter()
+
+    source = None
+    try:
+        if manifest_source:
+            # taken before the conversion, so a log that changes while it's converted is done again next time
+            source = dict(ExportManifest.source(in_file), hash=file_hash(in_file))
+
+        if profile:
+            match_start = time.perf_counter()
+        match_info = None
+        if add_match_info:
+            evtfn = find_event_file(in_file)
+            if evtfn:
+                try:
+                    match_info = find_match_info(evtfn)
+                except Exception:
+                    # unreadable event file, same as having no match info
+                    match_info = None
+        if profile:
+            file_stats['stages']['match_info'] = time.perf_counter() - match_start
+
+        if matches_only and not match_info:
+            return ConversionResult(in_file, None, 0, None, finish_file_stats(file_stats, started))
+
+        columns = output_columns(add_match_info, record_filter.columns if record_filter else None, merge_events)
+        writer = dslog_writers.WRITERS[fmt](part_file, columns, compression, header)
+        resampler = None
+        if resample:
+            import dslog_resample
+            resampler = dslog_resample.Resampler(*resample)
+        try:
+            count = write_log(in_file, writer, match_info, cancel_event, record_filter, file_stats, merge_events,
+                              resampler, time_format)
+        finally:
+            if profile:
+                close_start = time.perf_counter()
+            writer.close()
+            if profile:
+                file_stats['stages']['close'] = time.perf_counter() - close_start
+
+        # only a finished output ever has the real name
+        os.replace(part_file, out_file)
+
+    except Exception as e:
+        # don't leave a partial CSV behind
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        return ConversionResult(in_file, out_file, 0, str(e) or type(e).__name__,
+                                finish_file_stats(file_stats, started))
+
+    return ConversionResult(in_file, out_file, count, None, finish_file_stats(file_stats, started), source=source)
+
+
+def finish_file_stats(file_stats, started):
+    if file_stats is not None:
+        file_stats['seconds'] = time.perf_counter() - started
+        file_stats['peak_memory'] = peak_memory()
+    return file_stats
+
+
+# the record of what an incremental export has written, in its output folder
+MANIFEST_FILE = 'dslog2csv_manifest.json'
+
+
+def file_hash(input_file):
+    """SHA-256 of a log (anything open_input takes), as hex"""
+
+    digest = hashlib.sha256()
+    strm, owned = open_input(input_file)
+    try:
+        while True:
+            block = strm.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+    finally:
+        if owned:
+            strm.close()
+    return digest.hexdigest()
+
+
+class ExportManifest:
+    """The sources of the files in an output folder, so an export can skip the logs which haven't changed.
+
+    Entries are keyed on the output file name and have the size, modification time and hash of the log,
+    the size and modification time of its event file (for the match info and merged events), the export
+    options and the size and modification time of the output as it was written. An output is current if all
+    of those still match, so one that was overwritten by another export is written again. The hash is only
+    worked out when the size or time of the log has changed, so a log that was copied or touched isn't
+    exported again."""
+
+    VERSION = 2
+
+    def __init__(self, output_dir):
+        self.manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+        self.output_dir = output_dir
+        self.entries = {}
+        self.changed = False
+        self.load()
+        return
+
+    def load(self):
+        # if it's missing or unreadable, everything gets exported again
+        self.entries = load_entries(self.manifest_file, self.VERSION)
+        return
+
+    def save(self):
+        if not self.changed:
+            return
+        save_entries(self.manifest_file, self.VERSION, self.entries)
+        self.changed = False
+        return
+
+    @staticmethod
+    def source(in_file):
+        """What an entry records about a log, less its hash"""
+
+        size, mtime = input_stat(in_file)
+        events_size = events_mtime = None
+        event_file = find_event_file(in_file)
+        if event_file:
+            events_size, events_mtime = input_stat(event_file)
+        return {'size': size, 'mtime': mtime, 'events_size': events_size, 'events_mtime': events_mtime}
+
+    def check(self, in_file, out_file, options):
+        """The entry for converting in_file to out_file if out_file is current, otherwise None"""
+
+        entry = self.entries.get(os.path.basename(out_file))
+        if entry is None or entry['input_file'] != os.path.abspath(in_file) or entry['options'] != options:
+            return None
+        output_size, output_mtime = input_stat(out_file)
+        if (output_size, output_mtime) != (entry['output_size'], entry['output_mtime']):
+            return None
+        source = self.source(in_file)
+        if source['size'] is None or (source['events_size'], source['events_mtime']) != \
+                (entry['events_size'], entry['events_mtime']):
+            return None
+        if (source['size'], source['mtime']) != (entry['size'], entry['mtime']):
+            if source['size'] != entry['size'] or file_hash(in_file) != entry['hash']:
+                return None
+            # same contents, newer time
+            entry['mtime'] = source['mtime']
+            self.changed = True
+        return entry
+
+    def record(self, in_file, out_file, options, source, records):
+        """Note that out_file was converted from in_file, as it was when source was taken"""
+
+        output_size, output_mtime = input_stat(out_file)
+        entry = dict(source, input_file=os.path.abspath(in_file), options=options, records=records,
+                     output_size=output_size, output_mtime=output_mtime)
+        self.entries[os.path.basename(out_file)] = entry
+        self.changed = True
+        return
+
+
+def export_options(add_match_info, matches_only, fmt, compression, record_filter, merge_events, resample,
+                   time_format):
+    """Everything that changes the output of a log, as text to compare in the ExportManifest"""
+
+    return json.dumps([add_match_info, matches_only, fmt, compression, record_filter or RecordFilter(), merge_events,
+                       resample, time_format], default=str)
+
+
+def convert_files(files, outstrm=None, output_dir='', add_match_info=False, matches_only=False, jobs=1,
+                  cancel_event=None, fmt='csv', compression=None, record_filter=None, stats=None, merge_events=None,
+                  resample=None, incremental=False, time_format='datetime'):
+    """Convert DSLog files to CSV using up to jobs worker processes (None for one per CPU).
+
+    With outstrm, all the records go to that stream under a single header, in the same order as files.
+    Otherwise each file gets its own output in output_dir, in format fmt (see dslog_writers.WRITERS).
+    record_filter (a RecordFilter) limits the records and columns that are written.
+    If stats (a ConversionStats) is given, the timings of every file are added to it.
+    merge_events (one of MERGE_EVENTS) adds the events of each log to the CSV, see merged_rows.
+    resample (window, agg, status_agg, see dslog_resample.Resampler) writes a row per window of records instead
+    of every record.
+    incremental (with output_dir only) skips the logs whose output is current, according to the ExportManifest
+    in output_dir, and records the ones which are converted in it.
+    time_format (one of TIME_FORMATS) is how the times are written.
+    Yields a ConversionResult for each file as it finishes.
+
+    Setting cancel_event (a multiprocessing.Event if jobs is not 1) stops the conversion: files that have not
+    finished are reported as CANCELLED and their partial output is removed."""
+
+    single_output = outstrm is not None
+    if single_output:
+        if fmt != 'csv':
+            raise Exception("Only CSV can be written to a single output")
+        # the parts are copied into outstrm as they are
+        compression = None
+
+        columns = output_columns(add_match_info, record_filter.columns if record_filter else None, merge_events)
+        outcsv = csv.DictWriter(outstrm, fieldnames=columns, extrasaction='ignore')
+        outcsv.writeheader()
+        # each file is converted to a part without header, then the parts are copied out in order
+        part_dir = tempfile.mkdtemp(prefix='dslog2csv')
+        out_files = [os.path.join(part_dir, '{:06d}.csv'.format(i)) for i in range(len(files))]
+    else:
+        part_dir = None
+        extension = dslog_writers.WRITERS[fmt].file_extension(compression)
+        out_files = [os.path.join(output_dir, os.path.splitext(os.path.basename(fn))[0] + extension) for fn in files]
+
+    manifest = None
+    # results known before converting anything: outputs that are current, and logs that couldn't be checked
+    skipped = {}
+    if incremental:
+        if single_output:
+            raise Exception("Incremental exports need an output folder")
+        manifest = ExportManifest(output_dir)
+        options = export_options(add_match_info, matches_only, fmt, compression, record_filter, merge_events,
+                                 resample, time_format)
+        for i, fn in enumerate(files):
+            try:
+                entry = manifest.check(fn, out_files[i], options)
+            except Exception as e:
+                skipped[i] = ConversionResult(fn, None, 0, str(e) or type(e).__name__)
+                continue
+            if entry is not None:
+                skipped[i] = ConversionResult(fn, out_files[i], entry['records'], None, up_to_date=True)
+
+    def results():
+        yield from skipped.items()
+        if jobs is not None and jobs <= 1:
+            for i, fn in enumerate(files):
+                if i in skipped:
+                    continue
+                if cancel_event is not None and cancel_event.is_set():
+                    yield i, ConversionResult(fn, None, 0, CANCELLED)
+                else:
+                    yield i, convert_file(fn, out_files[i], add_match_info, matches_only, not single_output,
+                                          cancel_event, fmt, compression, record_filter, stats is not None,
+                                          merge_events, resample, time_format, incremental)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                                    initargs=(cancel_event,)) as executor:
+            futures = {}
+            for i, fn in enumerate(files):
+                if i in skipped:
+                    continue
+                fut = executor.submit(convert_file, fn, out_files[i], add_match_info, matches_only, not single_output,
+                                      fmt=fmt, compression=compression, record_filter=record_filter,
+                                      profile=stats is not None, merge_events=merge_events, resample=resample,
+                                      time_format=time_format, manifest_source=incremental)
+                futures[fut] = i
+
+            pending = set(futures)
+            while pending:
+                finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in finished:
+                    yield futures[fut], fut.result()
+
+                if cancel_event is not None and cancel_event.is_set():
+                    # drop the files that haven't started, the running ones stop themselves. Cancelled futures
+                    # never complete, so they are reported here rather than waited for
+                    for fut in list(pending):
+                        if fut.cancel():
+                            pending.discard(fut)
+                            yield futures[fut], ConversionResult(files[futures[fut]], None, 0, CANCELLED)
+        return
+
+    try:
+        finished = {}
+        next_part = 0
+        for i, res in results():
+            if stats is not None and res.stats is not None:
+                stats.add_file(res.stats)
+            if res.source is not None and res.error is None and res.output_file is not None:
+                manifest.record(res.input_file, res.output_file, options, res.source, res.records)
+            if single_output:
+                finished[i] = res
+                if stats is not None:
+                    merge_start = time.perf_counter()
+                while next_part in finished:
+                    part = finished.pop(next_part).output_file
+                    if part is not None and os.path.exists(part):
+                        with open(part, 'r', newline='') as partstrm:
+                            shutil.copyfileobj(partstrm, outstrm)
+                        os.remove(part)
+                    next_part += 1
+                if stats is not None:
+                    stats.stages['merge'] += time.perf_counter() - merge_start
+                # the parts are temporary, so don't report them
+                if res.output_file is not None:
+                    res = res._replace(output_file=getattr(outstrm, 'name', '<stream>'))
+            yield res
+    finally:
+        if part_dir is not None:
+            shutil.rmtree(part_dir, ignore_errors=True)
+        if manifest is not None:
+            manifest.save()
+        if stats is not None:
+            stats.finish()
+    return
+
+
 if __name__ == '__main__':
     import argparse
+    import dslog_resample
+    import dslog_summary
     parser = argparse.ArgumentParser(description='DSLog to CSV file')
     parser.add_argument('--one-output-per-file', action='store_true', help='Output one CSV per DSLog file')
     parser.add_argument('--output', '-o', help='Output filename (stdout otherwise)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='With --one-output-per-file, only convert the logs that are new or have changed since '
+                        'their output was written (tracked in {})'.format(MANIFEST_FILE))
     parser.add_argument('--event', action='store_true', help='Input files are EVENT files')
     parser.add_argument('--add-match-info', action='store_true', help='Look for EVENT files matching DSLOG files and '
                                                                       'pull info')
     parser.add_argument('--matches-only', action='store_true', help='Ignore files which have no match info. Implies '
                                                                     'add-match-info')
-    parser.add_argument('files', nargs='+', help='Input files')
+    parser.add_argument('--follow', '-f', action='store_true', help='Keep reading the (first) input file as the '
+                                                                    'Driver Station writes it')
+    parser.add_argument('--format', choices=sorted(dslog_writers.WRITERS), default='csv',
+                        help='Output format. Formats other than csv need --one-output-per-file')
+    parser.add_argument('--compression', help='Output compression: gzip for csv, deflate for npz, '
+                                              'lz4/zstd for arrow, snappy/gzip/brotli/lz4/zstd for parquet')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Number of files to convert in parallel '
+                                                                 '(0 for one per CPU)')
+    parser.add_argument('--columns', help='Comma separated list of the record columns to output (default: all)')
+    parser.add_argument('--start', type=float, help='Skip the records before this many seconds from the start of '
+                        'each log')
+    parser.add_argument('--end', type=float, help='Skip the records from this many seconds from the start of '
+                        'each log')
+    parser.add_argument('--mode', choices=sorted(MODE_COLUMNS), help='Only output records in this robot mode')
+    parser.add_argument('--merge-events', choices=MERGE_EVENTS, help='Add the events from the EVENT file of each '
+                        'log: in the row of the nearest record, or as rows of their own. CSV only')
+    parser.add_argument('--time-format', choices=TIME_FORMATS, default='datetime',
+                        help='How record times are written: date and time (the default), nanoseconds since 1970, '
+                        'or seconds from the start of the log')
+    parser.add_argument('--resample', help='Write one row per window of records instead of every record: a time '
+                        'like 100ms or 1s, or mode for each stretch in one robot mode. Needs numpy')
+    parser.add_argument('--agg', choices=dslog_resample.RESAMPLE_AGGREGATES, default='mean',
+                        help='How the numbers in each window are combined with --resample')
+    parser.add_argument('--status-agg', choices=dslog_resample.RESAMPLE_STATUS_AGGREGATES, default='any',
+                        help='How the status bits in each window are combined with --resample')
+    parser.add_argument('--summary', action='store_true', help='Output one row of summary statistics per log '
+                        'instead of the records. Needs numpy')
+    parser.add_argument('--profile', nargs='?', const='text', choices=['text', 'json'],
+                        help='Print the time spent in each stage of the conversion to stderr, as text or json')
+    parser.add_argument('files', nargs='+', help='Input files. A zip archive stands for the DSLog files in it')
 
     args = parser.parse_args()
 
     if args.matches_only:
         args.add_match_info = True
 
+    if args.format != 'csv' and not args.one_output_per_file:
+        parser.error('--format {} needs --one-output-per-file'.format(args.format))
+    if args.merge_events and args.format != 'csv':
+        parser.error('--merge-events needs --format csv')
+    if args.incremental and not args.one_output_per_file:
+        parser.error('--incremental needs --one-output-per-file')
+    if args.merge_events and args.time_format != 'datetime':
+        parser.error('--merge-events needs --time-format datetime')
+    resample = None
+    if args.resample:
+        if args.merge_events:
+            parser.error('--merge-events and --resample do not go together')
+        try:
+            resample = (dslog_resample.parse_window(args.resample), args.agg, args.status_agg)
+        except Exception as e:
+            parser.error(str(e))
+    if args.compression not in dslog_writers.WRITERS[args.format].compressions:
+        parser.error('--compression {} is not supported for --format {}'.format(args.compression, args.format))
+    columns = None
+    if args.columns:
+        columns = [name.strip() for name in args.columns.split(',') if name.strip()]
+        unknown = [name for name in columns if name not in DSLogParser.OUTPUT_COLUMNS]
+        if unknown:
+            parser.error('unknown columns: {}'.format(', '.join(unknown)))
+    record_filter = RecordFilter(columns, args.start, args.end, args.mode)
+    if args.compression and not args.one_output_per_file and not args.output:
+        parser.error('--compression needs --output or --one-output-per-file')
+
     if sys.platform == "win32":
         # do glob expanding on Windows. Linux/Mac does this automatically.
         import glob
@@ -280,61 +2049,89 @@ if __name__ == '__main__':
             newfiles.extend(glob.glob(a))
         args.files = newfiles
 
-    if args.event:
+    if not args.follow and not args.event:
+        # convert the logs inside archives, without extracting them
+        newfiles = []
+        for a in args.files:
+            if a.lower().endswith('.zip') and os.path.isfile(a):
+                newfiles.extend(archive_logs(a))
+            else:
+                newfiles.append(a)
+        args.files = newfiles
+
+    if args.follow:
+        fn = args.files[0]
+        # wait for the Driver Station to write the header
+        wait_for_file(fn, DSLogParser.HEADER_SIZE)
+        try:
+            if args.event:
+                dsparser = DSEventParser(fn)
+                for t, rec in dsparser.follow_records():
+                    print(t, rec, flush=True)
+            else:
+                match_info = None
+                if args.add_match_info:
+                    evtfn = find_event_file(fn)
+                    if evtfn:
+                        match_info = find_match_info(evtfn)
+
+                outstrm = open(args.output, 'w') if args.output else sys.stdout
+                outcsv = csv.DictWriter(outstrm, fieldnames=output_columns(args.add_match_info), extrasaction='ignore')
+                outcsv.writeheader()
+                dsparser = DSLogParser(fn, args.time_format)
+                for rec in dsparser.follow_records():
+                    outcsv.writerow(csv_row(rec, fn, match_info))
+                    outstrm.flush()
+        except KeyboardInterrupt:
+            pass
+
+    elif args.summary:
+        outstrm = open(args.output, 'w', newline='') if args.output else sys.stdout
+        failed = 0
+        for res in dslog_summary.summarize_files(args.files, outstrm, add_match_info=args.add_match_info,
+                                   matches_only=args.matches_only, jobs=args.jobs or None):
+            if res.error:
+                print('ERROR: {}: {}'.format(res.input_file, res.error), file=sys.stderr)
+                failed += 1
+        if args.output:
+            outstrm.close()
+        if failed:
+            sys.exit(1)
+
+    elif args.event:
         dsparser = DSEventParser(args.files[0])
         for t, rec in dsparser.read_records():
             print(t, rec)
 
     else:
-        col = ['inputfile', ]
-        if args.add_match_info:
-            col.append('match_info')
-        col.extend(DSLogParser.OUTPUT_COLUMNS)
-
         if not args.one_output_per_file:
-            if args.output:
+            if args.output and args.compression == 'gzip':
+                outstrm = gzip.open(args.output, 'wt', newline='')
+            elif args.output:
                 outstrm = open(args.output, 'w')
             else:
                 outstrm = sys.stdout
-            outcsv = csv.DictWriter(outstrm, fieldnames=col, extrasaction='ignore')
-            outcsv.writeheader()
-
         else:
             outstrm = None
-            outcsv = None
-
-        for fn in args.files:
-            match_info = None
 
-            if args.add_match_info:
-                evtfn = find_event_file(fn)
-                if evtfn:
-                    match_info = find_match_info(evtfn)
-
-            if args.matches_only and not match_info:
-                continue
-
-            if args.one_output_per_file:
-                if outstrm:
-                    outstrm.close()
-                outname, _ = os.path.splitext(os.path.basename(fn))
-                outname += '.csv'
-                outstrm = open(outname, 'w')
-                outcsv = csv.DictWriter(outstrm, fieldnames=col, extrasaction='ignore')
-                outcsv.writeheader()
-
-            dsparser = DSLogParser(fn)
-            for rec in dsparser.read_records():
-                rec['inputfile'] = fn
-                rec['match_info'] = match_info
-
-                # unpack the PDP currents to go into columns more easily
-                for i in range(16):
-                    rec['pdp_{}'.format(i)] = rec['pdp_currents'][i]
-
-                outcsv.writerow(rec)
+        stats = ConversionStats() if args.profile else None
+        failed = 0
+        for res in convert_files(args.files, outstrm=outstrm, add_match_info=args.add_match_info,
+                                 matches_only=args.matches_only, jobs=args.jobs or None,
+                                 fmt=args.format, compression=args.compression, record_filter=record_filter,
+                                 stats=stats, merge_events=args.merge_events, resample=resample,
+                                 incremental=args.incremental, time_format=args.time_format):
+            if res.error:
+                print('ERROR: {}: {}'.format(res.input_file, res.error), file=sys.stderr)
+                failed += 1
+
+        if outstrm is not None and args.output:
+            outstrm.close()
 
-            dsparser.close()
+        if args.profile == 'json':
+            print(json.dumps(stats.as_dict(), indent=2), file=sys.stderr)
+        elif args.profile:
+            print(stats.summary(), file=sys.stderr)
 
-        if args.output or args.one_output_per_file:
-            outstrm.close()
+        if failed:
+            sys.exit(1)
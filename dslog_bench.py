@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# Benchmarks for the DS log parsing, run against synthetic log files.
+#
+# The results can be saved as JSON (--json) and compared with an earlier run (--compare), e.g. from
+# before a change. Timings are the best of a few runs, to leave out as much noise as possible.
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import struct
+import random
+import zipfile
+import datetime
+import platform
+import tempfile
+import subprocess
+import dslog2csv
+import log_index
+import log_archive
+
+# records written at a time by write_dslog
+WRITE_CHUNK = 100000
+
+
+def pack_timestamp(unix_time):
+    sec = int(unix_time)
+    frac = int((unix_time - sec) * dslog2csv.MAX_INT64)
+    return struct.pack('>qQ', sec + dslog2csv.LABVIEW_EPOCH_OFFSET, frac)
+
+
+# a match, as (mode, seconds): the robot sits disabled, runs auto, pauses, runs tele and is disabled again
+MATCH_PHASES = (('disabled', 20), ('auto', 15), ('disabled', 2), ('tele', 135), ('disabled', 30))
+
+# the PDP channels with motors on them, which draw current while the robot is enabled
+MOTOR_CHANNELS = (0, 1, 2, 3, 12, 13)
+
+
+def status_byte(mode, brownout=False):
+    """The (inverted) status bits of a record where both the robot and the DS are in mode"""
+
+    true_bits = {'robot_' + mode, 'ds_' + mode}
+    if brownout:
+        true_bits.add('brownout')
+    return sum(1 << bit for bit, name in enumerate(dslog2csv.STATUS_COLUMNS) if name not in true_bits)
+
+
+def pack_currents(currents, temp=40, voltage=120, resistance=10):
+    """The three 64-bit PDP words for 16 currents (amps), see DSLogParser.parse_pdp_v3"""
+
+    raw = [min(int(c * 8), 0x3FF) for c in currents]
+    w2 = temp | (voltage << 8) | (resistance << 16)
+    for i, channel in enumerate(range(3, -1, -1)):
+        w2 |= raw[channel] << (54 - 10 * i)
+    w1 = 0
+    for i, channel in enumerate(range(9, 3, -1)):
+        w1 |= raw[channel] << (54 - 10 * i)
+    w0 = 0
+    for i, channel in enumerate(range(15, 9, -1)):
+        w0 |= raw[channel] << (54 - 10 * i)
+    return w0, w1, w2
+
+
+def match_records(count, rnd):
+    """Yield the packed bytes of count plausible records: matches one after the other, with the battery around
+    12V sagging under load, long stretches in each mode and currents only on the motor channels while enabled"""
+
+    record = dslog2csv.DSLogParser.RECORD_V3
+    phases = [(mode, int(seconds / dslog2csv.DSLogParser.RECORD_SPACING)) for mode, seconds in MATCH_PHASES]
+    idle = pack_currents([0.0] * 16)
+    currents = [0.0] * 16
+    battery = 12.8
+    written = 0
+    while written < count:
+        for mode, length in phases:
+            status = status_byte(mode)
+            for _ in range(min(length, count - written)):
+                if mode == 'disabled':
+                    words = idle
+                    load = 0.0
+                else:
+                    for channel in MOTOR_CHANNELS:
+                        currents[channel] = max(0.0, min(40.0, currents[channel] + rnd.gauss(0.0, 1.0)))
+                    words = pack_currents(currents)
+                    load = sum(currents)
+                volts = battery - 0.01 * load + rnd.gauss(0.0, 0.02)
+                battery -= 0.0000002 * load
+                brownout = volts < 6.8
+                loss = 0 if rnd.random() < 0.95 else rnd.randint(1, 10)
+
+                yield record.pack(
+                    rnd.randint(8, 30), loss, max(0, int(volts * 256)), rnd.randint(40, 160),
+                    status_byte(mode, True) if brownout else status, rnd.randint(20, 120),
+                    rnd.randint(70, 90), rnd.randint(256, 1024), written & 0xFF, *words)
+                written += 1
+            if written >= count:
+                return
+        battery = 12.8
+    return
+
+
+def write_dslog(filename, count, start_time=1.5e9, seed=0):
+    """Write a version 3 log file with count records, see match_records"""
+
+    rnd = random.Random(seed)
+    records = match_records(count, rnd)
+    with open(filename, 'wb') as strm:
+        strm.write(struct.pack('>i', 3))
+        strm.write(pack_timestamp(start_time))
+        for first in range(0, count, WRITE_CHUNK):
+            strm.write(b''.join(next(records) for _ in range(min(WRITE_CHUNK, count - first))))
+    return
+
+
+def write_log_folder(log_dir, logs, records, events, match_every=2, start_time=1.5e9):
+    """Write a folder of logs, each a .dslog and a .dsevents file named like the Driver Station does.
+
+    Every match_every'th log (0 for none) has match info. Returns the names of the .dslog files."""
+
+    names = []
+    for i in range(logs):
+        t = start_time + i * 600
+        name = datetime.datetime.fromtimestamp(t, datetime.timezone.utc).strftime('%Y_%m_%d %H_%M_%S %a')
+        match_info = None
+        if match_every and i % match_every == 0:
+            match_info = 'Qualification - {}:1'.format(i + 1)
+
+        write_dslog(os.path.join(log_dir, name + '.dslog'), records, t, seed=i)
+        write_dsevents(os.path.join(log_dir, name + '.dsevents'), events, match_info, start_time=t, seed=i)
+        names.append(name + '.dslog')
+    return names
+
+
+def write_dsevents(filename, count, match_info=None, match_index=None, start_time=1.5e9, seed=0):
+    """Write a version 3 event file with count events.
+
+    If match_info is given, event match_index (default: the middle one) is 'FMS Connected: <match_info>'."""
+
+    rnd = random.Random(seed)
+    if match_index is None:
+        match_index = count // 2
+
+    with open(filename, 'wb') as strm:
+        strm.write(struct.pack('>i', 3))
+        strm.write(pack_timestamp(start_time))
+
+        t = start_time
+        for i in range(count):
+            t += rnd.uniform(0.0, 0.5)
+            if match_info is not None and i == match_index:
+                msg = 'FMS Connected:   {}'.format(match_info)
+            else:
+                msg = '<TagVersion>1 <time> {:.3f} <message> Warning {} <code> 44004 <details> ' \
+                      'The Driver Station has lost communication with the robot.'.format(t - start_time, i)
+            msg = msg.encode('ascii')
+            strm.write(pack_timestamp(t))
+            strm.write(struct.pack('>i', len(msg)))
+            strm.write(msg)
+    return
+
+
+def find_match_info_reference(filename):
+    """find_match_info as it was, decoding every event through DSEventParser"""
+
+    rdr = dslog2csv.DSEventParser(filename)
+    for _, msg in rdr.read_records():
+        m = re.match(r'FMS Connected:\s+(?P<info>.*)\s*$', msg)
+        if m:
+            rdr.close()
+            return m.group('info')
+    rdr.close()
+    return None
+
+
+def export_csv_reference(filename):
+    """CSV export as it was, a dict per record through csv.DictWriter. Written to the null device
+    to leave the disk out of the timings."""
+
+    with open(os.devnull, 'w', newline='') as outstrm:
+        outcsv = csv.DictWriter(outstrm, fieldnames=dslog2csv.output_columns(True), extrasaction='ignore')
+        outcsv.writeheader()
+        dsparser = dslog2csv.DSLogParser(filename)
+        for rec in dsparser.read_records():
+            outcsv.writerow(dslog2csv.csv_row(rec, filename, 'Qualification - 12:1'))
+        dsparser.close()
+    return
+
+
+def export_csv(filename):
+    writer = dslog2csv.dslog_writers.CSVWriter(os.devnull, dslog2csv.output_columns(True))
+    dslog2csv.write_log(filename, writer, 'Qualification - 12:1')
+    writer.close()
+    return
+
+
+def archive_logs_reference(log_dir, names, file_name):
+    """Zip up logs the way LogHandler's ArchiveWorker used to, one at a time and uncompressed,
+    but leave the logs where they are"""
+
+    with zipfile.ZipFile(file_name, 'w') as z_file:
+        for name in names:
+            z_file.write(os.path.join(log_dir, name), name)
+    return
+
+
+def best_time(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def result(name, seconds, records=None, size=None, reference_s=None, **extra):
+    """One benchmark result, with the throughputs worked out"""
+
+    res = {'name': name, 'seconds': seconds}
+    if records is not None:
+        res['records'] = records
+        res['records_per_s'] = records / seconds
+    if size is not None:
+        res['bytes'] = size
+        res['mb_per_s'] = size / seconds / 1e6
+    if reference_s is not None:
+        res['reference_s'] = reference_s
+        res['speedup'] = reference_s / seconds
+    res.update(extra)
+    return res
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+    return
+
+
+def decode_records(filename):
+    dsparser = dslog2csv.DSLogParser(filename)
+    consume(dsparser.read_records())
+    dsparser.close()
+    return
+
+
+def decode_rows(filename, text=False):
+    dsparser = dslog2csv.DSLogParser(filename)
+    consume(dsparser.read_rows(text=text))
+    dsparser.close()
+    return
+
+
+def decode_columns(filename):
+    dsparser = dslog2csv.DSLogParser(filename)
+    while len(dsparser.read_columns(dslog2csv.COLUMN_CHUNK_SIZE)['time']) == dslog2csv.COLUMN_CHUNK_SIZE:
+        pass
+    dsparser.close()
+    return
+
+
+def decode_batches(filename):
+    dsparser = dslog2csv.DSLogParser(filename)
+    consume(dsparser.read_batches(dslog2csv.COLUMN_CHUNK_SIZE))
+    dsparser.close()
+    return
+
+
+def decode_events(filename):
+    rdr = dslog2csv.DSEventParser(filename)
+    consume(rdr.read_records())
+    rdr.close()
+    return
+
+
+def bench_decode(work_dir, count, repeat=3):
+    filename = os.path.join(work_dir, 'decode.dslog')
+    write_dslog(filename, count)
+    size = os.path.getsize(filename)
+
+    results = [
+        result('decode_records', best_time(decode_records, filename, repeat=repeat), count, size),
+        result('decode_rows', best_time(decode_rows, filename, repeat=repeat), count, size),
+        result('decode_rows_text', best_time(decode_rows, filename, True, repeat=repeat), count, size),
+    ]
+    if dslog2csv.numpy is not None:
+        results.append(result('decode_columns', best_time(decode_columns, filename, repeat=repeat), count, size))
+        results.append(result('decode_batches', best_time(decode_batches, filename, repeat=repeat), count, size))
+    return results
+
+
+def bench_match_info(work_dir, count, repeat=5):
+    results = []
+    for name, match_info in (('practice', None), ('match', 'Qualification - 12:1')):
+        filename = os.path.join(work_dir, '{}.dsevents'.format(name))
+        write_dsevents(filename, count, match_info)
+        assert find_match_info_reference(filename) == dslog2csv.find_match_info(filename)
+
+        ref = best_time(find_match_info_reference, filename, repeat=repeat)
+        new = best_time(dslog2csv.find_match_info, filename, repeat=repeat)
+        results.append(result('find_match_info_{}'.format(name), new, count, os.path.getsize(filename), ref))
+
+    filename = os.path.join(work_dir, 'practice.dsevents')
+    results.append(result('decode_events', best_time(decode_events, filename, repeat=repeat), count,
+                          os.path.getsize(filename)))
+    return results
+
+
+def bench_csv(work_dir, count, repeat=3):
+    filename = os.path.join(work_dir, 'export.dslog')
+    write_dslog(filename, count)
+
+    ref = best_time(export_csv_reference, filename, repeat=repeat)
+    new = best_time(export_csv, filename, repeat=repeat)
+    return [result('csv_export', new, count, os.path.getsize(filename), ref)]
+
+
+def bench_index(work_dir, logs, records, events, repeat=3):
+    """Listing a folder of logs in the GUI: with no index (every log parsed) and with an up to date one"""
+
+    log_dir = os.path.join(work_dir, 'index') + os.sep
+    os.mkdir(log_dir)
+    write_log_folder(log_dir, logs, records, events)
+    size = sum(os.path.getsize(os.path.join(log_dir, fn)) for fn in os.listdir(log_dir))
+    index_file = os.path.join(work_dir, 'log_index.json')
+
+    def cold():
+        if os.path.exists(index_file):
+            os.remove(index_file)
+        log_index.LogIndex(index_file).update(log_dir)
+        return
+
+    def warm():
+        log_index.LogIndex(index_file).update(log_dir)
+        return
+
+    cold_s = best_time(cold, repeat=repeat)
+    warm_s = best_time(warm, repeat=repeat)
+    return [
+        result('index_folder_cold', cold_s, size=size, logs=logs),
+        result('index_folder_warm', warm_s, size=size, logs=logs),
+    ]
+
+
+def bench_archive(work_dir, logs, records, events, repeat=3):
+    log_dir = os.path.join(work_dir, 'archive')
+    os.mkdir(log_dir)
+    names = write_log_folder(log_dir, logs, records, events)
+    names += [fn[:-6] + '.dsevents' for fn in names]
+    size = sum(os.path.getsize(os.path.join(log_dir, fn)) for fn in names)
+    zip_file = os.path.join(work_dir, 'archive.zip')
+    paths = [os.path.join(log_dir, fn) for fn in names]
+
+    def archive(compression):
+        if os.path.exists(zip_file):
+            os.remove(zip_file)
+        log_archive.archive_files(zip_file, paths, compression, remove=False)
+        return
+
+    ref = best_time(archive_logs_reference, log_dir, names, zip_file, repeat=repeat)
+    results = []
+    for compression in sorted(log_archive.COMPRESSIONS):
+        seconds = best_time(archive, compression, repeat=repeat)
+        results.append(result('archive_' + compression, seconds, size=size, reference_s=ref, logs=logs,
+                              archive_bytes=os.path.getsize(zip_file)))
+    return results
+
+
+# benchmark groups that can be picked with --only
+BENCHMARKS = ('decode', 'events', 'csv', 'index', 'archive')
+
+
+def run(work_dir, args):
+    results = []
+    if 'decode' in args.only:
+        results += bench_decode(work_dir, args.records, args.repeat)
+    if 'events' in args.only:
+        results += bench_match_info(work_dir, args.events, args.repeat)
+    if 'csv' in args.only:
+        results += bench_csv(work_dir, args.records, args.repeat)
+    if 'index' in args.only:
+        results += bench_index(work_dir, args.logs, args.log_records, args.log_events, args.repeat)
+    if 'archive' in args.only:
+        results += bench_archive(work_dir, args.logs, args.log_records, args.log_events, args.repeat)
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def machine_info():
+    return {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': dslog2csv.numpy.__version__ if dslog2csv.numpy is not None else None,
+    }
+
+
+def format_result(res, old=None):
+    text = '{:<26} {:9.4f}s'.format(res['name'], res['seconds'])
+    if 'records_per_s' in res:
+        text += ' {:12.0f} records/s'.format(res['records_per_s'])
+    if 'mb_per_s' in res:
+        text += ' {:9.1f} MB/s'.format(res['mb_per_s'])
+    if 'speedup' in res:
+        text += '  ({:.1f}x reference)'.format(res['speedup'])
+    if old is not None:
+        text += '  [{:+.1f}% vs {}]'.format((old['seconds'] / res['seconds'] - 1) * 100, old.get('commit') or 'old')
+    return text
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark DS log parsing on synthetic files')
+    parser.add_argument('--events', type=int, default=50000, help='Number of events in the generated event files')
+    parser.add_argument('--records', type=int, default=50000, help='Number of records in the generated log files')
+    parser.add_argument('--logs', type=int, default=40, help='Number of logs in the folder for the index and '
+                        'archive benchmarks')
+    parser.add_argument('--log-records', type=int, default=7500, help='Records per log in that folder')
+    parser.add_argument('--log-events', type=int, default=200, help='Events per log in that folder')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each benchmark, the best one counts')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='Comma separated benchmarks to run, out of ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--json', help='Save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    parser.add_argument('--generate', metavar='DIR', help="Don't benchmark, just write --logs synthetic logs "
+                        'into DIR')
+    args = parser.parse_args()
+
+    if args.generate:
+        os.makedirs(args.generate, exist_ok=True)
+        for fn in write_log_folder(args.generate, args.logs, args.log_records, args.log_events):
+            print(os.path.join(args.generate, fn))
+        sys.exit(0)
+
+    args.only = [name.strip() for name in args.only.split(',')]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+    old = {}
+    if args.compare:
+        with open(args.compare) as f:
+            old_run = json.load(f)
+        for res in old_run['results']:
+            old[res['name']] = dict(res, commit=old_run['machine'].get('commit'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = run(tmp_dir, args)
+
+    for res in results:
+        print(format_result(res, old.get(res['name'])))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'machine': machine_info(), 'args': vars(args), 'results': results}, f, indent=2)
@@ -0,0 +1,144 @@
+# Structured decoding of the messages in .dsevents files.
+#
+# Driver Station messages are made of tagged segments, e.g.
+#   <TagVersion>1 <time> 12.345 <count> 1 <flags> 0 <Code> 44004 <details> FRC: The Driver Station has lost
+#   communication with the robot. <location> Driver Station <stack>
+# decode_event splits them up and sorts each message into one of EVENT_TYPES, and EventIndex keeps the events
+# of a file by type and time, so looking for e.g. the first comms drop doesn't mean going through them all again.
+
+import re
+import bisect
+import datetime
+import collections
+import dslog2csv
+
+Event = collections.namedtuple('Event', ['time', 'type', 'message', 'code', 'details', 'tags', 'text'])
+Event.__doc__ = """One decoded event.
+
+time is the timestamp of the record (a datetime), type one of EVENT_TYPES. message is the <message> segment,
+else the <details>, else the text with no tags at all, code is the <Code> as an int (or None) and tags has
+every segment by name."""
+
+# in the order they are checked, the first that matches wins
+EVENT_TYPES = ('fms', 'comms', 'joystick', 'error', 'warning', 'info')
+
+TAG_RE = re.compile(r'<(\w+)>\s?')
+FMS_RE = re.compile(r'FMS (Connected|Disconnected)')
+COMMS_RE = re.compile(r'lost communication|communication (lost|restored)|no robot communication|Ping Results|'
+                      r'Robot (dis)?connected', re.IGNORECASE)
+JOYSTICK_RE = re.compile(r'joystick', re.IGNORECASE)
+ERROR_RE = re.compile(r'^\s*(ERROR|Error)\b')
+WARNING_RE = re.compile(r'^\s*(WARNING|Warning)\b')
+
+# Driver Station error codes that are about the connection to the robot
+COMMS_CODES = {44004, 44008}
+
+
+def split_tags(text):
+    """The segments of a message by tag name, and the text before the first tag"""
+
+    parts = TAG_RE.split(text)
+    tags = {}
+    for i in range(1, len(parts) - 1, 2):
+        tags[parts[i]] = parts[i + 1].strip()
+    return tags, parts[0].strip()
+
+
+def event_type(text, message, code, flags):
+    if FMS_RE.search(text):
+        return 'fms'
+    if (code is not None and abs(code) in COMMS_CODES) or COMMS_RE.search(text):
+        return 'comms'
+    if JOYSTICK_RE.search(text):
+        return 'joystick'
+    # coded messages have <flags> 1 for errors and 0 for warnings
+    if (flags is not None and flags & 1) or ERROR_RE.search(message):
+        return 'error'
+    if WARNING_RE.search(message) or (code is not None and flags == 0):
+        return 'warning'
+    return 'info'
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_event(time, text):
+    """Decode one (time, text) record from DSEventParser.read_records"""
+
+    tags, untagged = split_tags(text)
+
+    message = tags.get('message') or tags.get('details') or untagged
+    code = to_int(tags.get('Code', tags.get('code')))
+    details = tags.get('details')
+    flags = to_int(tags.get('flags'))
+
+    return Event(time, event_type(text, message, code, flags), message, code, details, tags, text)
+
+
+def read_events(input_file):
+    """Yield the decoded events of an event file (anything dslog2csv.open_input takes)"""
+
+    rdr = dslog2csv.DSEventParser(input_file)
+    try:
+        for time, text in rdr.read_records():
+            yield decode_event(time, text)
+    finally:
+        rdr.close()
+    return
+
+
+class EventIndex:
+    """The events of a file, with lookups by type and time.
+
+    Times can be datetimes, or seconds from the time of the first event."""
+
+    def __init__(self, events):
+        self.events = sorted(events, key=lambda e: e.time)
+        self.times = [e.time for e in self.events]
+
+        self.by_type = {t: [] for t in EVENT_TYPES}
+        for i, e in enumerate(self.events):
+            self.by_type[e.type].append(i)
+        self.type_times = {t: [self.times[i] for i in indices] for t, indices in self.by_type.items()}
+        return
+
+    @classmethod
+    def from_file(cls, input_file):
+        return cls(read_events(input_file))
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def to_time(self, when):
+        if when is None or not self.events or not isinstance(when, (int, float)):
+            return when
+        return self.times[0] + datetime.timedelta(seconds=when)
+
+    def find(self, event_type=None, start=None, end=None):
+        """Events of event_type (None for all) with start <= time < end. None leaves that side open."""
+
+        times = self.times if event_type is None else self.type_times[event_type]
+        first = 0 if start is None else bisect.bisect_left(times, self.to_time(start))
+        last = len(times) if end is None else bisect.bisect_left(times, self.to_time(end))
+        if event_type is None:
+            return self.events[first:last]
+        return [self.events[i] for i in self.by_type[event_type][first:last]]
+
+    def first(self, event_type=None, start=None):
+        """The first event of event_type at or after start, or None"""
+
+        times = self.times if event_type is None else self.type_times[event_type]
+        i = 0 if start is None else bisect.bisect_left(times, self.to_time(start))
+        if i >= len(times):
+            return None
+        return self.events[i] if event_type is None else self.events[self.by_type[event_type][i]]
+
+    def counts(self):
+        return {t: len(indices) for t, indices in self.by_type.items()}
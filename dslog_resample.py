@@ -0,0 +1,166 @@
+# Resampling of DS log records: one row per window of records (a fixed time, or each stretch in one robot
+# mode) with the numbers and status bits aggregated, for dslog2csv --resample.
+
+import re
+import datetime
+import dslog2csv
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# aggregations for Resampler, for the numbers and for the status bits
+RESAMPLE_AGGREGATES = ('mean', 'min', 'max', 'last')
+RESAMPLE_STATUS_AGGREGATES = ('any', 'all')
+
+
+def parse_window(text):
+    """Parse a resampling window like '100ms', '1s' or 'mode' into a number of records, or 'mode'"""
+
+    if text == 'mode':
+        return text
+    m = re.match(r'^\s*(\d+(\.\d*)?)\s*(ms|s)\s*$', text)
+    if not m:
+        raise Exception("Bad resampling window {}, use e.g. 100ms, 1s or mode".format(text))
+    seconds = float(m.group(1)) / (1000.0 if m.group(3) == 'ms' else 1.0)
+    return max(1, int(round(seconds / dslog2csv.DSLogParser.RECORD_SPACING)))
+
+
+class Resampler:
+    """Turns the chunks of columns from read_columns into one row per window of records, in one pass.
+
+    window is a number of records (see parse_window), counted from the start of the log, or 'mode' for a window
+    each time the robot changes between disabled, auto and tele. In each window the numbers are aggregated with
+    agg and the status bits with status_agg, time is the time of the first record and pdp_id the last one.
+    Only partial aggregates are kept for the window that is still open, so memory does not depend on the window."""
+
+    def __init__(self, window, agg='mean', status_agg='any'):
+        if agg not in RESAMPLE_AGGREGATES:
+            raise Exception("Unknown aggregation {}".format(agg))
+        if status_agg not in RESAMPLE_STATUS_AGGREGATES:
+            raise Exception("Unknown status aggregation {}".format(status_agg))
+        if numpy is None:
+            raise Exception("numpy is required to resample logs")
+
+        self.window = window
+        self.agg = agg
+        self.status_agg = status_agg
+        self.numbers = [name for name in dslog2csv.DSLogParser.OUTPUT_COLUMNS[1:]
+                        if name not in dslog2csv.STATUS_COLUMNS and name != 'pdp_id']
+
+        # the open window: its key, the index of its last record and its partial aggregates
+        self.held = None
+        self.held_key = None
+        self.held_index = None
+        return
+
+    def window_keys(self, cols, indices):
+        if self.window != 'mode':
+            return indices // self.window
+        return cols['robot_auto'] * 1 + cols['robot_tele'] * 2
+
+    def partials(self, cols, starts):
+        res = {'time': cols['time'][starts], 'pdp_id': cols['pdp_id'][numpy.append(starts[1:], len(cols['time'])) - 1],
+               'records': numpy.diff(numpy.append(starts, len(cols['time'])))}
+        for name in self.numbers:
+            values = cols[name]
+            if self.agg == 'mean':
+                res[name] = numpy.add.reduceat(values, starts)
+            elif self.agg == 'min':
+                res[name] = numpy.minimum.reduceat(values, starts)
+            elif self.agg == 'max':
+                res[name] = numpy.maximum.reduceat(values, starts)
+            else:
+                res[name] = values[numpy.append(starts[1:], len(values)) - 1]
+        ufunc = numpy.logical_or if self.status_agg == 'any' else numpy.logical_and
+        for name in dslog2csv.STATUS_COLUMNS:
+            res[name] = ufunc.reduceat(cols[name], starts)
+        return res
+
+    def merge_held(self, parts):
+        """Fold the open window into the first window of parts, which carries it on"""
+
+        held = self.held
+        parts['time'][0] = held['time'][0]
+        parts['records'][0] += held['records'][0]
+        for name in self.numbers:
+            if self.agg == 'mean':
+                parts[name][0] += held[name][0]
+            elif self.agg == 'min':
+                parts[name][0] = min(parts[name][0], held[name][0])
+            elif self.agg == 'max':
+                parts[name][0] = max(parts[name][0], held[name][0])
+        for name in dslog2csv.STATUS_COLUMNS:
+            if self.status_agg == 'any':
+                parts[name][0] |= held[name][0]
+            else:
+                parts[name][0] &= held[name][0]
+        return
+
+    def finish_windows(self, parts):
+        if self.agg == 'mean':
+            for name in self.numbers:
+                parts[name] = parts[name] / parts['records']
+        return parts
+
+    def add(self, cols, indices):
+        """Add a chunk of records, with their record numbers. Returns the columns of the windows that are complete,
+        or None."""
+
+        n = len(indices)
+        if n == 0:
+            return None
+
+        keys = self.window_keys(cols, indices)
+        new = numpy.empty(n, dtype=bool)
+        new[0] = (self.held is None or keys[0] != self.held_key or
+                  (self.window == 'mode' and indices[0] != self.held_index + 1))
+        new[1:] = keys[1:] != keys[:-1]
+        if self.window == 'mode':
+            # records that were filtered out in between also end a window
+            new[1:] |= numpy.diff(indices) > 1
+
+        starts = numpy.flatnonzero(new)
+        if len(starts) == 0 or starts[0] != 0:
+            starts = numpy.concatenate(([0], starts))
+        parts = self.partials(cols, starts)
+
+        done = None
+        if self.held is not None:
+            if new[0]:
+                done = self.held
+            else:
+                self.merge_held(parts)
+
+        # the last window stays open for the next chunk
+        if len(starts) > 1:
+            complete = {name: values[:-1] for name, values in parts.items()}
+            if done is not None:
+                complete = {name: numpy.concatenate((done[name], values)) for name, values in complete.items()}
+            done = complete
+        self.held = {name: values[-1:] for name, values in parts.items()}
+        self.held_key = keys[-1]
+        self.held_index = indices[-1]
+
+        return None if done is None else self.finish_windows(done)
+
+    def finish(self):
+        """The columns of the last window, or None"""
+
+        done = self.held
+        self.held = None
+        return None if done is None else self.finish_windows(done)
+
+    @staticmethod
+    def text_rows(cols, columns):
+        """Rows of text for CSVWriter.write_rows from the columns of some windows"""
+
+        values = []
+        for name in columns:
+            if name == 'time' and cols[name].dtype.kind == 'M':
+                times = cols[name].astype('datetime64[us]').tolist()
+                values.append([str(t.replace(tzinfo=datetime.timezone.utc)) for t in times])
+            else:
+                values.append([str(v) for v in cols[name].tolist()])
+        return list(zip(*values))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# SQLite database of the records of many DS logs, so questions across a whole season can be answered with
+# a query instead of exporting and searching every log again.
+#
+# Ingesting is incremental: a log that is already in the database with the same size and modification time
+# is skipped, and one that has changed is replaced.
+
+import os
+import sys
+import csv
+import glob
+import sqlite3
+import itertools
+import dslog2csv
+
+# the record columns, as stored. time is in seconds since 1970 (UTC)
+RECORD_COLUMNS = dslog2csv.DSLogParser.OUTPUT_COLUMNS
+
+# records per executemany
+INSERT_BATCH = 10000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER,
+    mtime INTEGER,
+    match_info TEXT,
+    start_time REAL,
+    records INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_match_info ON files (match_info);
+CREATE TABLE IF NOT EXISTS records (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    time REAL NOT NULL,
+    {columns}
+);
+CREATE INDEX IF NOT EXISTS records_file_time ON records (file_id, time);
+CREATE INDEX IF NOT EXISTS records_time ON records (time);
+'''.format(columns=',\n    '.join(name + (' INTEGER' if name.startswith(('robot_', 'ds_')) or
+                                           name in ('watchdog', 'brownout', 'pdp_id') else ' REAL')
+                                   for name in RECORD_COLUMNS[1:]))
+
+
+class LogStore:
+    def __init__(self, db_file):
+        self.db = sqlite3.connect(db_file)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript(SCHEMA)
+        return
+
+    def close(self):
+        self.db.close()
+        return
+
+    def is_current(self, path, size, mtime):
+        row = self.db.execute('SELECT size, mtime FROM files WHERE path = ?', (path, )).fetchone()
+        return row is not None and tuple(row) == (size, mtime)
+
+    def ingest_file(self, path):
+        """Load one log, and the match info from its event file. Returns the number of records, or None if
+        it was already in the database."""
+
+        path = os.path.abspath(path)
+        size, mtime = dslog2csv.input_stat(path)
+        if size is None:
+            raise Exception("{} not found".format(path))
+        if self.is_current(path, size, mtime):
+            return None
+
+        match_info = None
+        evtfn = dslog2csv.find_event_file(path)
+        if evtfn:
+            try:
+                match_info = dslog2csv.find_match_info(evtfn)
+            except Exception:
+                match_info = None
+
+        dsparser = dslog2csv.DSLogParser(path)
+        try:
+            # one transaction for the whole file, so it is either all in or not at all
+            with self.db:
+                old = self.db.execute('SELECT id FROM files WHERE path = ?', (path, )).fetchone()
+                if old is not None:
+                    self.db.execute('DELETE FROM records WHERE file_id = ?', old)
+                    self.db.execute('DELETE FROM files WHERE id = ?', old)
+
+                start_time = dsparser.start_time.timestamp()
+                file_id = self.db.execute(
+                    'INSERT INTO files (path, size, mtime, match_info, start_time, records) VALUES (?, ?, ?, ?, ?, 0)',
+                    (path, size, mtime, match_info, start_time)).lastrowid
+
+                insert = 'INSERT INTO records VALUES ({})'.format(', '.join('?' * (len(RECORD_COLUMNS) + 1)))
+                spacing = dsparser.RECORD_SPACING
+                count = 0
+                rows = dsparser.read_rows()
+                while True:
+                    # the times are worked out from the record number, which is quicker than converting datetimes
+                    batch = [(file_id, start_time + (count + i) * spacing) + row[1:]
+                             for i, row in enumerate(itertools.islice(rows, INSERT_BATCH))]
+                    self.db.executemany(insert, batch)
+                    count += len(batch)
+                    if len(batch) < INSERT_BATCH:
+                        break
+
+                self.db.execute('UPDATE files SET records = ? WHERE id = ?', (count, file_id))
+        finally:
+            dsparser.close()
+        return count
+
+    def ingest(self, paths, progress=None):
+        """Ingest many logs. progress(path, records or None for skipped, error) is called after each one.
+        Returns the number of files ingested, skipped and failed."""
+
+        ingested = skipped = failed = 0
+        for path in paths:
+            try:
+                count = self.ingest_file(path)
+                error = None
+            except Exception as e:
+                count = None
+                error = str(e) or type(e).__name__
+            if error:
+                failed += 1
+            elif count is None:
+                skipped += 1
+            else:
+                ingested += 1
+            if progress is not None:
+                progress(path, count, error)
+        return ingested, skipped, failed
+
+    def query(self, sql, params=()):
+        """Run a query, returning the column names and the rows"""
+
+        cur = self.db.execute(sql, params)
+        return [d[0] for d in cur.description or ()], cur.fetchall()
+
+    def low_voltage(self, volts):
+        """The logs which dropped below volts, lowest first, e.g. to find brownouts"""
+
+        return self.query('SELECT files.match_info, files.path, MIN(records.voltage) AS min_voltage, '
+                          'COUNT(*) AS records_below FROM records JOIN files ON files.id = records.file_id '
+                          'WHERE records.voltage < ? GROUP BY records.file_id ORDER BY min_voltage', (volts, ))
+
+
+def find_logs(paths):
+    """The DSLog files for paths which can be logs, folders of logs or zip archives of logs"""
+
+    res = []
+    for path in paths:
+        if os.path.isdir(path):
+            res.extend(sorted(glob.glob(os.path.join(path, '*.dslog'))))
+        elif path.lower().endswith('.zip') and os.path.isfile(path):
+            res.extend(dslog2csv.archive_logs(path))
+        else:
+            res.extend(sorted(glob.glob(path)) or [path])
+    return res
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='SQLite database of DS log records')
+    parser.add_argument('database', help='Database file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest = sub.add_parser('ingest', help='Add logs to the database')
+    ingest.add_argument('files', nargs='+', help='Log files, folders of logs or zip archives of logs')
+    query = sub.add_parser('query', help='Run an SQL query and print the result as CSV')
+    query.add_argument('sql', help='The query. Tables are files and records')
+    low = sub.add_parser('low-voltage', help='List the logs where the voltage dropped below a limit')
+    low.add_argument('volts', type=float, help='Voltage limit')
+    args = parser.parse_args()
+
+    store = LogStore(args.database)
+    try:
+        if args.command == 'ingest':
+            def report(path, count, error):
+                if error:
+                    print('ERROR: {}: {}'.format(path, error), file=sys.stderr)
+                elif count is not None:
+                    print('{}: {} records'.format(path, count))
+                return
+
+            ingested, skipped, failed = store.ingest(find_logs(args.files), report)
+            print('Ingested {} files, skipped {} unchanged, {} failed'.format(ingested, skipped, failed))
+            if failed:
+                sys.exit(1)
+        else:
+            if args.command == 'query':
+                columns, rows = store.query(args.sql)
+            else:
+                columns, rows = store.low_voltage(args.volts)
+            outcsv = csv.writer(sys.stdout)
+            outcsv.writerow(columns)
+            outcsv.writerows(rows)
+    finally:
+        store.close()
@@ -0,0 +1,175 @@
+# Summary statistics of DS logs, one row per log: voltage, brownouts, time in each mode, packet loss and
+# PDP currents, for dslog2csv --summary and the GUI's Summarize button.
+
+import csv
+import itertools
+import collections
+import concurrent.futures
+import dslog2csv
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the columns of summarize_log, one row per log
+SUMMARY_COLUMNS = (['inputfile', 'match_info', 'start_time', 'duration', 'records', 'voltage_min', 'voltage_mean',
+                    'brownouts', 'watchdogs', 'auto_time', 'tele_time', 'disabled_time', 'packet_loss_p50',
+                    'packet_loss_p90', 'packet_loss_p99', 'packet_loss_max', 'can_usage_max'] +
+                   ['pdp_{}_peak'.format(i) for i in range(16)] +
+                   ['pdp_{}_amp_seconds'.format(i) for i in range(16)] +
+                   ['pdp_total_current_peak', 'pdp_total_amp_seconds'])
+
+SummaryResult = collections.namedtuple('SummaryResult', ['input_file', 'summary', 'error'])
+SummaryResult.__doc__ = """Outcome of summarizing one DSLog file. summary is None if it was skipped or failed."""
+
+
+def percentile(counts, total, fraction):
+    """Nearest rank percentile of values counted in a dict of value: count"""
+
+    rank = max(1, int(-(-fraction * total // 1)))
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+def rising_edges(values, previous):
+    """How many times values goes from False to True, with previous the value before the first one"""
+
+    return int(numpy.count_nonzero(values & ~numpy.concatenate(([previous], values[:-1]))))
+
+
+def summarize_log(in_file, match_info=None, cancel_event=None):
+    """Work out the SUMMARY_COLUMNS of a DSLog file in one pass, a batch of records at a time. Requires numpy.
+
+    Times are in seconds, brownouts and watchdogs count how many times they started. Packet loss takes one of
+    256 values, so its percentiles come from counting each value rather than keeping them all."""
+
+    if numpy is None:
+        raise Exception("numpy is required to summarize logs")
+
+    spacing = dslog2csv.DSLogParser.RECORD_SPACING
+    count = 0
+    voltage_min = None
+    voltage_sum = 0.0
+    edges = {'brownout': 0, 'watchdog': 0}
+    last = {'brownout': False, 'watchdog': False}
+    mode_records = {'robot_auto': 0, 'robot_tele': 0, 'robot_disabled': 0}
+    packet_loss = collections.Counter()
+    can_max = None
+    pdp_peak = numpy.zeros(16)
+    pdp_sum = numpy.zeros(16)
+    total_peak = 0.0
+    total_sum = 0.0
+
+    dsparser = dslog2csv.DSLogParser(in_file)
+    try:
+        start_time = dsparser.start_time
+        for batch in dsparser.read_batches(dslog2csv.COLUMN_CHUNK_SIZE):
+            cols = batch.columns
+            n = len(batch)
+            if n > 0:
+                count += n
+                chunk_min = cols['voltage'].min()
+                voltage_min = chunk_min if voltage_min is None else min(voltage_min, chunk_min)
+                voltage_sum += cols['voltage'].sum()
+                for name in edges:
+                    edges[name] += rising_edges(cols[name], last[name])
+                    last[name] = bool(cols[name][-1])
+                for name in mode_records:
+                    mode_records[name] += int(numpy.count_nonzero(cols[name]))
+                values, value_counts = numpy.unique(cols['packet_loss'], return_counts=True)
+                packet_loss.update(dict(zip(values.tolist(), value_counts.tolist())))
+                chunk_max = cols['can_usage'].max()
+                can_max = chunk_max if can_max is None else max(can_max, chunk_max)
+                pdp_peak = numpy.maximum(pdp_peak, cols['pdp_currents'].max(axis=0))
+                pdp_sum += cols['pdp_currents'].sum(axis=0)
+                total_peak = max(total_peak, cols['pdp_total_current'].max())
+                total_sum += cols['pdp_total_current'].sum()
+
+            if cancel_event is not None and cancel_event.is_set():
+                raise dslog2csv.ConversionCancelled(dslog2csv.CANCELLED)
+    finally:
+        dsparser.close()
+
+    res = {
+        'inputfile': in_file,
+        'match_info': match_info,
+        'start_time': start_time,
+        'duration': count * spacing,
+        'records': count,
+        'voltage_min': voltage_min,
+        'voltage_mean': voltage_sum / count if count else None,
+        'brownouts': edges['brownout'],
+        'watchdogs': edges['watchdog'],
+        'auto_time': mode_records['robot_auto'] * spacing,
+        'tele_time': mode_records['robot_tele'] * spacing,
+        'disabled_time': mode_records['robot_disabled'] * spacing,
+        'packet_loss_p50': percentile(packet_loss, count, 0.50),
+        'packet_loss_p90': percentile(packet_loss, count, 0.90),
+        'packet_loss_p99': percentile(packet_loss, count, 0.99),
+        'packet_loss_max': max(packet_loss) if packet_loss else None,
+        'can_usage_max': can_max,
+        'pdp_total_current_peak': total_peak,
+        'pdp_total_amp_seconds': total_sum * spacing,
+    }
+    for i in range(16):
+        res['pdp_{}_peak'.format(i)] = float(pdp_peak[i])
+        res['pdp_{}_amp_seconds'.format(i)] = float(pdp_sum[i] * spacing)
+    # plain floats, not numpy ones
+    for name, value in res.items():
+        if isinstance(value, numpy.generic):
+            res[name] = value.item()
+    return res
+
+
+def summarize_file(in_file, add_match_info=False, matches_only=False, cancel_event=None):
+    """summarize_log, with problems returned in the result instead of raised"""
+
+    cancel_event = dslog2csv.worker_cancel_event(cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return SummaryResult(in_file, None, dslog2csv.CANCELLED)
+
+    try:
+        match_info = None
+        if add_match_info:
+            evtfn = dslog2csv.find_event_file(in_file)
+            if evtfn:
+                try:
+                    match_info = dslog2csv.find_match_info(evtfn)
+                except Exception:
+                    match_info = None
+        if matches_only and not match_info:
+            return SummaryResult(in_file, None, None)
+        return SummaryResult(in_file, summarize_log(in_file, match_info, cancel_event), None)
+    except Exception as e:
+        return SummaryResult(in_file, None, str(e) or type(e).__name__)
+
+
+def summarize_files(files, outstrm, add_match_info=False, matches_only=False, jobs=1, cancel_event=None):
+    """Write a CSV to outstrm with a row of SUMMARY_COLUMNS for each DSLog file, in the same order as files,
+    using up to jobs worker processes (None for one per CPU). Yields a SummaryResult for each file."""
+
+    outcsv = csv.DictWriter(outstrm, fieldnames=SUMMARY_COLUMNS)
+    outcsv.writeheader()
+
+    if jobs is not None and jobs <= 1:
+        results = (summarize_file(fn, add_match_info, matches_only, cancel_event) for fn in files)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=dslog2csv.init_worker,
+                                                          initargs=(cancel_event,))
+        results = executor.map(summarize_file, files, itertools.repeat(add_match_info),
+                               itertools.repeat(matches_only))
+    try:
+        for res in results:
+            if res.summary is not None:
+                outcsv.writerow(res.summary)
+            yield res
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return
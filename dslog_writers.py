@@ -0,0 +1,235 @@
+# Output formats for converted DS logs.
+#
+# CSV is written in blocks of rows from DSLogParser.read_rows. The columnar formats
+# (Parquet, Arrow IPC and NPZ) are written in chunks of numpy columns from DSLogParser.read_columns,
+# so memory stays bounded however long the log is. Those need numpy, and Parquet/Arrow need pyarrow.
+
+import io
+import os
+import csv
+import gzip
+import shutil
+import zipfile
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# columns which are the same for every record of a file
+CONSTANT_COLUMNS = ('inputfile', 'match_info')
+
+
+class OutputWriter:
+    """Base class of the output formats.
+
+    Row writers implement write_rows, columnar ones write_columns. Either way, the values for
+    CONSTANT_COLUMNS are plain values, not one per record, and they come first in columns."""
+
+    extension = None
+    columnar = False
+    compressions = (None, )
+
+    def __init__(self, filename, columns, compression=None, header=True):
+        if compression not in self.compressions:
+            raise Exception("Unknown compression {} for {} output".format(compression, self.extension))
+
+        self.filename = filename
+        self.columns = columns
+        self.compression = compression
+        self.header = header
+        return
+
+    @classmethod
+    def file_extension(cls, compression=None):
+        return cls.extension
+
+    def write_rows(self, rows, constants):
+        raise NotImplementedError
+
+    def write_columns(self, cols):
+        raise NotImplementedError
+
+    def close(self):
+        return
+
+
+class CSVWriter(OutputWriter):
+    extension = '.csv'
+    compressions = (None, 'gzip')
+
+    def __init__(self, filename, columns, compression=None, header=True):
+        super().__init__(filename, columns, compression, header)
+
+        if compression == 'gzip':
+            self.strm = gzip.open(filename, 'wt', newline='')
+        else:
+            self.strm = open(filename, 'w', newline='')
+        self.outcsv = csv.writer(self.strm)
+        if header:
+            self.outcsv.writerow(columns)
+
+        self.constant_columns = [name for name in columns if name in CONSTANT_COLUMNS]
+        return
+
+    @classmethod
+    def file_extension(cls, compression=None):
+        if compression == 'gzip':
+            return cls.extension + '.gz'
+        return cls.extension
+
+    def write_rows(self, rows, constants):
+        """Write rows from DSLogParser.read_rows(text=True) after the constant columns.
+
+        Those values are all plain text which never needs quoting, so the lines are joined up directly,
+        which is much faster than going through the csv module. The constant columns are formatted once."""
+
+        prefix = io.StringIO()
+        csv.writer(prefix, lineterminator='').writerow([constants.get(name) for name in self.constant_columns])
+        prefix = prefix.getvalue() + ',' if self.constant_columns else ''
+
+        self.strm.write(''.join([prefix + ','.join(row) + '\r\n' for row in rows]))
+        return
+
+    def close(self):
+        self.strm.close()
+        return
+
+
+class ArrowWriter(OutputWriter):
+    """Arrow IPC file. The constant columns are dictionary encoded, so they cost next to nothing."""
+
+    extension = '.arrow'
+    columnar = True
+    compressions = (None, 'lz4', 'zstd')
+
+    def __init__(self, filename, columns, compression=None, header=True):
+        super().__init__(filename, columns, compression, header)
+        if numpy is None or pyarrow is None:
+            raise Exception("pyarrow is required for {} output".format(self.extension))
+        self.writer = None
+        return
+
+    def make_writer(self, schema):
+        options = pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+        return pyarrow.ipc.new_file(self.filename, schema, options=options)
+
+    def record_batch(self, cols):
+        num_records = len(cols['time'])
+
+        arrays = []
+        for name in self.columns:
+            if name in CONSTANT_COLUMNS:
+                value = cols.get(name)
+                if value is None:
+                    indices = pyarrow.nulls(num_records, type=pyarrow.int32())
+                    dictionary = pyarrow.array([], type=pyarrow.string())
+                else:
+                    indices = pyarrow.array(numpy.zeros(num_records, dtype=numpy.int32))
+                    dictionary = pyarrow.array([value], type=pyarrow.string())
+                arrays.append(pyarrow.DictionaryArray.from_arrays(indices, dictionary))
+            elif name == 'time' and cols[name].dtype.kind == 'M':
+                arrays.append(pyarrow.array(cols[name], type=pyarrow.timestamp('us', tz='UTC')))
+            else:
+                arrays.append(pyarrow.array(cols[name]))
+        return pyarrow.RecordBatch.from_arrays(arrays, names=self.columns)
+
+    def write_columns(self, cols):
+        batch = self.record_batch(cols)
+        if self.writer is None:
+            self.writer = self.make_writer(batch.schema)
+        self.writer.write_batch(batch)
+        return
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        return
+
+
+class ParquetWriter(ArrowWriter):
+    """Parquet file, one row group per chunk"""
+
+    extension = '.parquet'
+    compressions = (None, 'snappy', 'gzip', 'brotli', 'lz4', 'zstd')
+
+    def make_writer(self, schema):
+        return pyarrow.parquet.ParquetWriter(self.filename, schema, compression=self.compression or 'none')
+
+
+class NPZWriter(OutputWriter):
+    """numpy .npz archive, loaded with numpy.load.
+
+    Each column is appended to a temporary file as it comes in, and they are copied into the archive
+    at the end, once their length is known. The constant columns are stored as 0-d string arrays,
+    with '' for no match info."""
+
+    extension = '.npz'
+    columnar = True
+    compressions = (None, 'deflate')
+
+    def __init__(self, filename, columns, compression=None, header=True):
+        super().__init__(filename, columns, compression, header)
+        if numpy is None:
+            raise Exception("numpy is required for {} output".format(self.extension))
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='dslog_npz')
+        self.parts = {}
+        self.constants = {}
+        self.num_records = 0
+        return
+
+    def write_columns(self, cols):
+        for name in self.columns:
+            if name in CONSTANT_COLUMNS:
+                self.constants[name] = cols.get(name) or ''
+                continue
+
+            arr = numpy.ascontiguousarray(cols[name])
+            if name not in self.parts:
+                self.parts[name] = (open(os.path.join(self.tmp_dir, name), 'wb'), arr.dtype)
+            self.parts[name][0].write(arr.tobytes())
+
+        self.num_records += len(cols['time'])
+        return
+
+    def close(self):
+        compression = zipfile.ZIP_DEFLATED if self.compression == 'deflate' else zipfile.ZIP_STORED
+        try:
+            with zipfile.ZipFile(self.filename, 'w', compression=compression, allowZip64=True) as zf:
+                for name in self.columns:
+                    if name in self.constants:
+                        with zf.open(name + '.npy', 'w') as member:
+                            numpy.lib.format.write_array(member, numpy.array(self.constants[name]))
+                    elif name in self.parts:
+                        with zf.open(name + '.npy', 'w', force_zip64=True) as member:
+                            strm, dtype = self.parts[name]
+                            strm.close()
+                            header = {'descr': numpy.lib.format.dtype_to_descr(dtype),
+                                      'fortran_order': False,
+                                      'shape': (self.num_records, )}
+                            numpy.lib.format.write_array_header_1_0(member, header)
+                            with open(strm.name, 'rb') as part:
+                                shutil.copyfileobj(part, member)
+        finally:
+            for strm, _ in self.parts.values():
+                strm.close()
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter,
+    'npz': NPZWriter,
+}
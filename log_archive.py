@@ -0,0 +1,226 @@
+# Zip archives of DS logs.
+#
+# The members are compressed in a pool of threads (zlib, bz2 and lzma all release the GIL while they work)
+# and written to the archive in order as they finish, so the archive never has more than a few files in memory.
+# New logs are appended to an existing archive, and the source files are only removed once their members have
+# been read back and checked.
+
+import os
+import bz2
+import zlib
+import zipfile
+import collections
+import concurrent.futures
+
+COMPRESSIONS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bz2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# the levels each compression takes, the others have none and ignore it
+LEVELS = {
+    'deflate': range(0, 10),
+    'bz2': range(1, 10),
+}
+DEFAULT_LEVEL = 6
+
+ArchiveResult = collections.namedtuple('ArchiveResult', ['archived', 'failed', 'bytes_in', 'bytes_out'])
+ArchiveResult.__doc__ = """Outcome of archive_files.
+
+archived are the source files that are in the archive and have been removed, failed are (file, error) pairs
+for the ones that could not be archived. bytes_in and bytes_out are the size of archived before and after."""
+
+
+def companion_files(paths):
+    """The logs plus their .dsevents files, where there are any"""
+
+    res = []
+    # everything in res, or still to come from paths
+    seen = set(paths)
+    for path in paths:
+        res.append(path)
+        if path.endswith('.dslog'):
+            event_file = path[:-6] + '.dsevents'
+            if event_file not in seen and os.path.exists(event_file):
+                res.append(event_file)
+                seen.add(event_file)
+    return res
+
+
+def check_level(compression, level):
+    if compression not in COMPRESSIONS:
+        raise Exception("Unknown archive compression {}".format(compression))
+    if compression in LEVELS and level not in LEVELS[compression]:
+        levels = LEVELS[compression]
+        raise Exception("The {} compression level must be {} to {}, not {}".format(
+            compression, levels[0], levels[-1], level))
+    return
+
+
+def get_compressor(compress_type, level):
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    elif compress_type == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(level)
+    elif compress_type == zipfile.ZIP_LZMA:
+        # the zip flavour of lzma has a header of its own, which only zipfile knows how to write
+        return zipfile.LZMACompressor()
+    return None
+
+
+# the parts of an open ZipFile that write_compressed uses
+ZIPFILE_ATTRS = ('fp', 'start_dir', 'filelist', 'NameToInfo', '_writecheck', '_didModify')
+
+
+def can_write_compressed(zf):
+    """Whether write_compressed works with this version of zipfile"""
+
+    return all(hasattr(zf, attr) for attr in ZIPFILE_ATTRS) and hasattr(zipfile, 'LZMACompressor')
+
+
+def compress_member(path, compress_type, level, compress=True):
+    """Read and compress one file, returning its ZipInfo (with the sizes and CRC filled in) and the compressed data.
+
+    Without compress the data is returned as it is, for ZipFile to compress."""
+
+    zinfo = zipfile.ZipInfo.from_file(path, os.path.basename(path))
+    zinfo.compress_type = compress_type
+    with open(path, 'rb') as strm:
+        data = strm.read()
+
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    compressor = get_compressor(compress_type, level) if compress else None
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    zinfo.compress_size = len(data)
+    return zinfo, data
+
+
+def write_compressed(zf, zinfo, data):
+    """Add an already compressed member to an open ZipFile.
+
+    ZipFile can only compress members itself, so this does what ZipFile.open(zinfo, 'w') followed by
+    closing the member would do, minus the compression. That takes some of ZipFile's internals, so only
+    use it where can_write_compressed(zf)."""
+
+    zinfo.flag_bits = 0
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        # the data ends with an end of stream marker
+        zinfo.flag_bits |= 0x02
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+
+    zf.fp.seek(zf.start_dir)
+    zinfo.header_offset = zf.fp.tell()
+    zf._writecheck(zinfo)
+    zf._didModify = True
+    zf.fp.write(zinfo.FileHeader(zip64))
+    zf.fp.write(data)
+    zf.start_dir = zf.fp.tell()
+
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    return
+
+
+def same_member(zinfo, other):
+    return zinfo.file_size == other.file_size and zinfo.CRC == other.CRC
+
+
+def verify_member(zf, name, size):
+    """Read a member back, which checks its CRC, and make sure it has all of the source file"""
+
+    read = 0
+    with zf.open(name) as member:
+        while True:
+            block = member.read(1 << 20)
+            if not block:
+                break
+            read += len(block)
+    if read != size:
+        raise Exception("{} is {} bytes in the archive, not {}".format(name, read, size))
+    return
+
+
+def archive_files(file_name, paths, compression='deflate', level=DEFAULT_LEVEL, jobs=None, remove=True,
+                  progress=None, cancel_event=None):
+    """Add files to the zip archive file_name, creating it if needed, then remove them (if remove).
+
+    Members are named after the files, without their folders, and a file that is already in the archive with
+    the same contents is not added twice. Up to jobs threads (None for one per CPU) compress the files.
+    progress(path, size) is called as each file is written, and setting cancel_event stops the archiving
+    after the files already being compressed. Only files which are then verified in the archive are removed.
+    Returns an ArchiveResult."""
+
+    # a bad level would fail every file, so catch it before touching the archive
+    check_level(compression, level)
+    compress_type = COMPRESSIONS[compression]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    written = []
+    failed = []
+    mode = 'a' if os.path.exists(file_name) else 'w'
+    with zipfile.ZipFile(file_name, mode, allowZip64=True) as zf:
+        # without the internals write_compressed needs, ZipFile compresses the files itself, one at a time
+        parallel = can_write_compressed(zf)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = collections.deque()
+            remaining = iter(paths)
+
+            def submit():
+                # keep a couple of files per thread on the go, and no more
+                while len(pending) < 2 * jobs:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    path = next(remaining, None)
+                    if path is None:
+                        return
+                    pending.append((path, executor.submit(compress_member, path, compress_type, level, parallel)))
+                return
+
+            submit()
+            while pending:
+                path, fut = pending.popleft()
+                try:
+                    zinfo, data = fut.result()
+                    existing = zf.NameToInfo.get(zinfo.filename)
+                    if existing is None and parallel:
+                        write_compressed(zf, zinfo, data)
+                    elif existing is None:
+                        zf.writestr(zinfo, data, compresslevel=level)
+                    elif not same_member(zinfo, existing):
+                        raise Exception("a different {} is already in the archive".format(zinfo.filename))
+                    written.append((path, zinfo.file_size))
+                    if progress is not None:
+                        progress(path, zinfo.file_size)
+                except Exception as e:
+                    failed.append((path, str(e) or type(e).__name__))
+                submit()
+
+    if mode == 'w' and not written:
+        # nothing went in a new archive, don't leave it lying around
+        os.remove(file_name)
+        return ArchiveResult([], failed, 0, 0)
+
+    # read back what went in before anything is removed
+    archived = []
+    bytes_in = bytes_out = 0
+    with zipfile.ZipFile(file_name, 'r') as zf:
+        for path, size in written:
+            name = os.path.basename(path)
+            try:
+                verify_member(zf, name, size)
+            except Exception as e:
+                failed.append((path, str(e) or type(e).__name__))
+                continue
+            archived.append(path)
+            bytes_in += size
+            bytes_out += zf.getinfo(name).compress_size
+
+    if remove:
+        for path in archived:
+            os.remove(path)
+    return ArchiveResult(archived, failed, bytes_in, bytes_out)
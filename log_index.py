@@ -0,0 +1,172 @@
+# On-disk cache of the metadata of the logs in a folder, so they don't all have to be parsed every time
+# the folder is listed. Entries are keyed on the log path and re-read when the size or mtime of the
+# .dslog or .dsevents file changes.
+
+import os
+import os.path
+import glob
+import datetime
+import dslog2csv
+
+
+class LogIndex:
+    VERSION = 1
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.entries = {}
+        self.load()
+        return
+
+    def load(self):
+        # if it's missing or unreadable, start again
+        self.entries = dslog2csv.load_entries(self.index_file, self.VERSION)
+        return
+
+    def save(self):
+        dslog2csv.save_entries(self.index_file, self.VERSION, self.entries)
+        return
+
+    @staticmethod
+    def key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def file_stat(path):
+        return dslog2csv.input_stat(path)
+
+    @staticmethod
+    def read_entry(log_dir, name):
+        """Parse the metadata of one log. Logs without a readable event file are marked as not valid."""
+
+        path = log_dir + name
+        event_file = path[:-6] + '.dsevents'
+        size, mtime = LogIndex.file_stat(path)
+        events_size, events_mtime = LogIndex.file_stat(event_file)
+
+        entry = {
+            'name': name,
+            'size': size,
+            'mtime': mtime,
+            'events_size': events_size,
+            'events_mtime': events_mtime,
+            'valid': False,
+            'is_match': False,
+            'match_info': None,
+            'records': 0,
+            'start_time': None,
+            'duration': 0.0,
+        }
+
+        try:
+            match_info = dslog2csv.find_match_info(event_file)
+
+            dsparser = dslog2csv.DSLogParser(path)
+            start_time = dsparser.curr_time
+            dsparser.close()
+            if start_time is None:
+                # the Driver Station hasn't finished writing the header yet
+                return entry
+        except Exception:
+            return entry
+
+        records = max(0, size - dslog2csv.DSLogParser.HEADER_SIZE) // dslog2csv.DSLogParser.RECORD_SIZE
+        entry.update({
+            'valid': True,
+            'is_match': match_info is not None,
+            'match_info': match_info,
+            'records': records,
+            'start_time': start_time.isoformat(),
+            'duration': records * dslog2csv.DSLogParser.RECORD_SPACING,
+        })
+        return entry
+
+    def is_current(self, entry, path):
+        return (entry['size'], entry['mtime']) == self.file_stat(path) and \
+            (entry['events_size'], entry['events_mtime']) == self.file_stat(path[:-6] + '.dsevents')
+
+    def update(self, log_dir):
+        """Bring the entries for a folder up to date and return the valid ones, in folder order"""
+
+        changed = False
+        log_data = []
+        seen = set()
+        for path in glob.glob(log_dir + '*.dslog'):
+            key = self.key(path)
+            seen.add(key)
+
+            entry = self.entries.get(key)
+            if entry is None or not self.is_current(entry, path):
+                entry = self.read_entry(log_dir, path[len(log_dir):])
+                self.entries[key] = entry
+                changed = True
+
+            if entry['valid']:
+                log_data.append(entry)
+
+        # evict logs that have gone, from this folder or any other
+        for key in list(self.entries):
+            if key not in seen and not dslog2csv.input_exists(key):
+                del self.entries[key]
+                changed = True
+
+        if changed:
+            self.save()
+        return log_data
+
+    def update_files(self, log_dir, names):
+        """Bring the entries of some logs in a folder up to date, e.g. the ones a folder watcher saw change,
+        without going through the rest of the folder. Returns {name: entry}, with None for the logs which
+        have gone or aren't valid."""
+
+        changed = False
+        updates = {}
+        for name in names:
+            path = log_dir + name
+            key = self.key(path)
+            entry = self.entries.get(key)
+            if not os.path.exists(path):
+                if entry is not None:
+                    del self.entries[key]
+                    changed = True
+                updates[name] = None
+                continue
+
+            if entry is None or not self.is_current(entry, path):
+                entry = self.read_entry(log_dir, name)
+                self.entries[key] = entry
+                changed = True
+            updates[name] = entry if entry['valid'] else None
+
+        if changed:
+            self.save()
+        return updates
+
+    def update_archive(self, file_name):
+        """Like update, for the logs in a zip archive. Their names are paths inside the archive
+        (see dslog2csv.split_archive_path)."""
+
+        changed = False
+        log_data = []
+        for path in dslog2csv.archive_logs(file_name):
+            key = self.key(path)
+            entry = self.entries.get(key)
+            if entry is None or not self.is_current(entry, path):
+                entry = self.read_entry(file_name + os.sep, path[len(file_name) + 1:])
+                self.entries[key] = entry
+                changed = True
+
+            if entry['valid']:
+                log_data.append(entry)
+
+        if changed:
+            self.save()
+        return log_data
+
+
+def start_time(entry):
+    """Start time of an index entry as a datetime, or None"""
+
+    if entry['start_time'] is None:
+        return None
+    return datetime.datetime.fromisoformat(entry['start_time'])
@@ -0,0 +1,75 @@
+import os
+import multiprocessing
+
+import pytest
+
+import dslog2csv
+from test_decode import write_log
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_incremental(tmp_path, jobs):
+    logs = [str(write_log(tmp_path / 'a.dslog', 500)), str(tmp_path / 'missing.dslog'),
+            str(write_log(tmp_path / 'b.dslog', 300, seed=1))]
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+
+    def convert():
+        results = dslog2csv.convert_files(logs, output_dir=str(out_dir), incremental=True, jobs=jobs)
+        return {os.path.basename(res.input_file): res for res in results}
+
+    # a log that can't be read fails on its own, the others are still converted
+    results = convert()
+    assert results['missing.dslog'].error
+    assert [results[name].records for name in ('a.dslog', 'b.dslog')] == [500, 300]
+    assert not any(results[name].error or results[name].up_to_date for name in ('a.dslog', 'b.dslog'))
+
+    manifest = dslog2csv.ExportManifest(str(out_dir))
+    assert sorted(manifest.entries) == ['a.csv', 'b.csv']
+    assert manifest.entries['a.csv']['hash'] == dslog2csv.file_hash(logs[0])
+
+    with open(logs[2], 'ab') as strm:
+        strm.write(bytes(dslog2csv.DSLogParser.RECORD_SIZE))
+    results = convert()
+    assert results['missing.dslog'].error
+    assert results['a.dslog'].up_to_date and results['a.dslog'].records == 500
+    assert not results['b.dslog'].up_to_date and results['b.dslog'].records == 301
+
+
+def test_incremental_overwritten(tmp_path):
+    log = str(write_log(tmp_path / 'a.dslog', 500))
+    out_dir = str(tmp_path / 'out')
+    os.mkdir(out_dir)
+
+    def convert(**kwargs):
+        return list(dslog2csv.convert_files([log], output_dir=out_dir, **kwargs))[0]
+
+    assert not convert(incremental=True).up_to_date
+    assert convert(incremental=True).up_to_date
+
+    # another export into the same folder replaces the output, which is then not the one in the manifest
+    convert(record_filter=dslog2csv.RecordFilter(['voltage']))
+    res = convert(incremental=True)
+    assert not res.up_to_date and res.error is None
+    with open(res.output_file) as strm:
+        assert strm.readline().startswith('inputfile,time,')
+    assert convert(incremental=True).up_to_date
+
+
+def test_cancel(tmp_path):
+    logs = [str(write_log(tmp_path / '{}.dslog'.format(i), 2000, seed=i)) for i in range(12)]
+    cancel_event = multiprocessing.Event()
+
+    results = []
+    for res in dslog2csv.convert_files(logs, output_dir=str(tmp_path), jobs=2, cancel_event=cancel_event):
+        results.append(res)
+        cancel_event.set()
+
+    # every log is reported exactly once, and the ones that didn't finish left no output behind
+    assert sorted(res.input_file for res in results) == sorted(logs)
+    assert any(res.error == dslog2csv.CANCELLED for res in results)
+    for res in results:
+        if res.error is None:
+            assert os.path.exists(res.output_file)
+        elif res.output_file is not None:
+            assert not os.path.exists(res.output_file)
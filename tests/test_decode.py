@@ -0,0 +1,218 @@
+# The batch decoders (read_columns, read_rows, read_batches and DSLogMap) must give exactly the values of
+# read_records, which decodes one record at a time and is the reference.
+
+import random
+import datetime
+import struct
+
+import pytest
+
+import dslog2csv
+
+numpy = pytest.importorskip('numpy')
+
+RECORDS = 3000
+
+# the start of the logs, 2018-12-03 00:02:03.5 UTC, in LabVIEW time
+START = struct.pack('>qQ', 3626640123, 2**62)
+
+
+def write_log(path, count, seed=0):
+    """A version 3 log of random records, so every bit pattern of every field turns up"""
+
+    rnd = random.Random(seed)
+    with open(path, 'wb') as strm:
+        strm.write(struct.pack('>i', 3))
+        strm.write(START)
+        strm.write(rnd.randbytes(count * dslog2csv.DSLogParser.RECORD_SIZE))
+    return path
+
+
+def event_time(seconds):
+    """The LabVIEW time stamp of seconds after START"""
+
+    ns = 500000000 + round(seconds * 10**9)
+    return struct.pack('>qQ', 3626640123 + ns // 10**9, (ns % 10**9) * dslog2csv.MAX_INT64 // 10**9)
+
+
+def write_events(path, events):
+    """A version 3 event file of (seconds after START, message) events"""
+
+    with open(path, 'wb') as strm:
+        strm.write(struct.pack('>i', 3))
+        strm.write(START)
+        for seconds, message in events:
+            if isinstance(message, str):
+                message = message.encode('utf-8')
+            strm.write(event_time(seconds))
+            strm.write(struct.pack('>i', len(message)))
+            strm.write(message)
+    return path
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(write_log(tmp_path / 'test.dslog', RECORDS))
+
+
+def reference(log_file, **kwargs):
+    dsparser = dslog2csv.DSLogParser(log_file)
+    try:
+        return list(dsparser.read_records(**kwargs))
+    finally:
+        dsparser.close()
+
+
+def record_values(rec, name):
+    """The value of an OUTPUT_COLUMNS column in a read_records dict"""
+
+    if name.startswith('pdp_') and name[4:].isdigit():
+        return rec['pdp_currents'][int(name[4:])]
+    return rec[name]
+
+
+def assert_columns_match(cols, records):
+    assert len(cols['time']) == len(records)
+    for name in dslog2csv.DSLogParser.OUTPUT_COLUMNS:
+        expected = [record_values(rec, name) for rec in records]
+        if name == 'time':
+            expected = [t.replace(tzinfo=None) for t in expected]
+            assert cols[name].astype('datetime64[us]').tolist() == expected, name
+        else:
+            assert cols[name].tolist() == expected, name
+    assert cols['pdp_currents'].tolist() == [rec['pdp_currents'] for rec in records]
+    for name in ('pdp_resistance', 'pdp_voltage', 'pdp_temp'):
+        assert cols[name].tolist() == [rec[name] for rec in records], name
+
+
+@pytest.mark.parametrize('mode', sorted(dslog2csv.MODE_COLUMNS))
+def test_read_records_mode(log_file, mode):
+    records = reference(log_file)
+    column = dslog2csv.MODE_COLUMNS[mode]
+    assert reference(log_file, mode=mode) == [rec for rec in records if rec[column]]
+
+
+def test_read_columns(log_file):
+    records = reference(log_file)
+    dsparser = dslog2csv.DSLogParser(log_file)
+    # in uneven chunks, to cross the chunk boundaries
+    chunks = []
+    while True:
+        cols = dsparser.read_columns(1001)
+        chunks.append(cols)
+        if len(cols['time']) < 1001:
+            break
+    dsparser.close()
+
+    cols = {name: numpy.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+    assert_columns_match(cols, records)
+
+
+def test_read_rows(log_file):
+    records = reference(log_file)
+    dsparser = dslog2csv.DSLogParser(log_file)
+    rows = list(dsparser.read_rows())
+    dsparser.close()
+
+    names = dslog2csv.DSLogParser.OUTPUT_COLUMNS
+    assert rows == [tuple(record_values(rec, name) for name in names) for rec in records]
+
+
+def test_read_rows_text(log_file):
+    records = reference(log_file)
+    dsparser = dslog2csv.DSLogParser(log_file)
+    rows = list(dsparser.read_rows(text=True))
+    dsparser.close()
+
+    names = dslog2csv.DSLogParser.OUTPUT_COLUMNS
+    assert rows == [tuple(str(record_values(rec, name)) for name in names) for rec in records]
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'mode': 'tele'},
+    {'start': 3.3, 'end': 40.0},
+    {'columns': ['time', 'voltage', 'robot_auto']},
+    {'columns': ['pdp_3', 'pdp_total_current'], 'mode': 'auto'},
+])
+def test_read_batches(log_file, kwargs):
+    records = reference(log_file, **kwargs)
+    names = [name for name in dslog2csv.DSLogParser.OUTPUT_COLUMNS
+             if 'columns' not in kwargs or name in kwargs['columns']]
+
+    dsparser = dslog2csv.DSLogParser(log_file)
+    rows = []
+    for batch in dsparser.read_batches(700, **kwargs):
+        assert len(batch) <= 700
+        rows.extend(rec.values() for rec in batch)
+    dsparser.close()
+
+    assert rows == [tuple(record_values(rec, name) for name in names) for rec in records]
+
+
+def test_time_formats(log_file):
+    with dslog2csv.DSLogParser(log_file) as dsparser:
+        start = dsparser.start_time
+    # the header of write_log, exactly
+    start_ns = (3626640123 - dslog2csv.LABVIEW_EPOCH_OFFSET) * 10**9 + 500000000
+    assert start.microsecond == 500000
+    expected = {
+        'datetime': [start + datetime.timedelta(milliseconds=20 * i) for i in range(RECORDS)],
+        'ns': [start_ns + 20000000 * i for i in range(RECORDS)],
+        'seconds': [0.02 * i for i in range(RECORDS)],
+    }
+
+    for time_format, times in expected.items():
+        dsparser = dslog2csv.DSLogParser(log_file, time_format)
+        assert dsparser.start_ns == start_ns
+        assert [rec['time'] for rec in dsparser.read_records()] == times, time_format
+        dsparser.close()
+
+        # mode filtering skips records without decoding them, the times must still line up
+        dsparser = dslog2csv.DSLogParser(log_file, time_format)
+        tele = [rec['time'] for rec in dsparser.read_records(mode='tele')]
+        dsparser.close()
+        dsparser = dslog2csv.DSLogParser(log_file, time_format)
+        assert tele == [t for t, rec in zip(times, reference(log_file)) if rec['robot_tele']], time_format
+        assert [row[0] for row in dsparser.read_rows(start=3.3)] == times[165:], time_format
+        dsparser.close()
+
+        with dslog2csv.DSLogMap(log_file, time_format) as dsmap:
+            assert [rec['time'] for rec in dsmap[100:200]] == times[100:200]
+            column = dsmap.columns(slice(100, 200))['time']
+            if time_format == 'datetime':
+                assert column.astype('datetime64[us]').tolist() == [t.replace(tzinfo=None) for t in times[100:200]]
+            else:
+                assert column.tolist() == times[100:200], time_format
+
+
+def test_start_ns(tmp_path):
+    # a start time with more digits than a datetime keeps
+    fraction = 123456789 * dslog2csv.MAX_INT64 // 10**9 + 1
+    header = struct.pack('>iqQ', 3, 3626640123, fraction)
+    dsparser = dslog2csv.DSLogParser(header + bytes(2 * dslog2csv.DSLogParser.RECORD_SIZE), 'ns')
+    start_ns = (3626640123 - dslog2csv.LABVIEW_EPOCH_OFFSET) * 10**9 + 123456789
+    assert dsparser.start_ns == start_ns
+    assert [rec['time'] for rec in dsparser.read_records()] == [start_ns, start_ns + 20000000]
+    assert dsparser.start_time.microsecond == 123457
+
+
+def test_dslog_map(log_file):
+    records = reference(log_file)
+    with dslog2csv.DSLogMap(log_file) as dsmap:
+        assert len(dsmap) == len(records)
+        assert dsmap[:] == records
+        assert dsmap[-1] == records[-1]
+        assert_columns_match(dsmap.columns(slice(100, 2100)), records[100:2100])
+
+
+def test_dslog_map_close_with_raw_view(log_file):
+    dsmap = dslog2csv.DSLogMap(log_file)
+    raw = dsmap.raw(slice(0, 10))
+    with pytest.raises(Exception, match='raw'):
+        dsmap.close()
+    # still usable, and closes once the view is gone
+    assert dsmap[5] == dsmap.record(5)
+    raw.release()
+    dsmap.close()
+    assert dsmap.map.closed
@@ -0,0 +1,117 @@
+# A log gives the same records whether it is read from its path, from a zip archive, from bytes or from a stream.
+
+import io
+import os
+import pathlib
+import zipfile
+
+import pytest
+
+import dslog2csv
+from test_decode import write_log, write_events, reference
+
+EVENTS = [(0.5, '<message> Warning 1'), (1.0, 'FMS Connected:   Qualification - 12:1'), (2.0, '<message> Info')]
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """The log and its events as plain files, and in a zip archive, at the top and in a folder"""
+
+    log_file = str(write_log(tmp_path / 'a.dslog', 1000))
+    event_file = str(write_events(tmp_path / 'a.dsevents', EVENTS))
+    zip_file = str(tmp_path / 'logs.zip')
+    with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name in ('a.dslog', 'a.dsevents'):
+            zf.write(str(tmp_path / name), name)
+            zf.write(str(tmp_path / name), 'season/' + name)
+    return log_file, event_file, zip_file
+
+
+def inputs(path, zip_file, name):
+    """The ways of giving the file at path, which is also name in zip_file"""
+
+    with open(path, 'rb') as strm:
+        data = strm.read()
+    # a stream is read from where it is
+    offset = io.BytesIO(b'junk' + data)
+    offset.seek(4)
+    return {
+        'path': path,
+        'pathlib': pathlib.Path(path),
+        'bytes': data,
+        'bytearray': bytearray(data),
+        'memoryview': memoryview(data),
+        'stream': io.BytesIO(data),
+        'offset stream': offset,
+        'zip': os.path.join(zip_file, name),
+        'zip folder': os.path.join(zip_file, 'season', name),
+    }
+
+
+def test_log_inputs(logs):
+    log_file, event_file, zip_file = logs
+    records = reference(log_file)
+    for kind, input_file in inputs(log_file, zip_file, 'a.dslog').items():
+        dsparser = dslog2csv.DSLogParser(input_file)
+        assert list(dsparser.read_records()) == records, kind
+        dsparser.close()
+        if isinstance(input_file, io.IOBase):
+            # streams that were passed in are left open
+            assert not input_file.closed
+            input_file.seek(4 if kind == 'offset stream' else 0)
+
+        dsparser = dslog2csv.DSLogParser(input_file)
+        assert len(dsparser.read_columns()['time']) == len(records), kind
+        dsparser.close()
+
+    for kind, input_file in inputs(log_file, zip_file, 'a.dslog').items():
+        if isinstance(input_file, io.IOBase):
+            continue
+        with dslog2csv.DSLogMap(input_file) as dsmap:
+            assert dsmap[:] == records, kind
+
+
+def test_event_inputs(logs):
+    log_file, event_file, zip_file = logs
+    dsparser = dslog2csv.DSEventParser(event_file)
+    events = list(dsparser.read_records())
+    dsparser.close()
+    assert [text for _, text in events] == [text for _, text in EVENTS]
+
+    for kind, input_file in inputs(event_file, zip_file, 'a.dsevents').items():
+        dsparser = dslog2csv.DSEventParser(input_file)
+        assert list(dsparser.read_records()) == events, kind
+        dsparser.close()
+        if isinstance(input_file, io.IOBase):
+            input_file.seek(4 if kind == 'offset stream' else 0)
+        assert dslog2csv.find_match_info(input_file) == 'Qualification - 12:1', kind
+
+
+def test_archive_paths(logs):
+    log_file, event_file, zip_file = logs
+    member = os.path.join(zip_file, 'season', 'a.dslog')
+
+    assert sorted(dslog2csv.archive_logs(zip_file)) == [os.path.join(zip_file, 'a.dslog'), member]
+    assert dslog2csv.split_archive_path(member) == (zip_file, 'season/a.dslog')
+    assert dslog2csv.split_archive_path(log_file) == (log_file, None)
+    assert dslog2csv.find_event_file(member) == os.path.join(zip_file, 'season', 'a.dsevents')
+
+    assert dslog2csv.input_exists(member)
+    assert not dslog2csv.input_exists(os.path.join(zip_file, 'b.dslog'))
+    assert dslog2csv.input_stat(member) == (os.path.getsize(log_file), os.stat(zip_file).st_mtime_ns)
+    assert dslog2csv.input_stat(os.path.join(zip_file, 'b.dslog')) == (None, None)
+    assert dslog2csv.file_hash(member) == dslog2csv.file_hash(log_file)
+
+
+def test_convert_from_archive(logs, tmp_path):
+    log_file, event_file, zip_file = logs
+    outputs = []
+    for input_file in (log_file, os.path.join(zip_file, 'season', 'a.dslog')):
+        out_file = str(tmp_path / 'out{}.csv'.format(len(outputs)))
+        res = dslog2csv.convert_file(input_file, out_file, add_match_info=True)
+        assert res.error is None and res.records == 1000
+        with open(out_file) as strm:
+            # the same apart from the inputfile column
+            outputs.append([line.split(',', 1)[1] for line in strm])
+    assert outputs[0] == outputs[1]
+    assert 'Qualification - 12:1' in outputs[0][1]
@@ -0,0 +1,137 @@
+# archive_files must only remove a log once it is in the archive and has been read back.
+
+import os
+import random
+import zipfile
+
+import pytest
+
+import log_archive
+
+
+def write_files(folder, names, seed=0):
+    """Files of compressible bytes, as {path: contents}"""
+
+    rnd = random.Random(seed)
+    files = {}
+    for name in names:
+        data = bytes(rnd.choice(b'\x00\x00\x00\x01\x7f') for _ in range(20000))
+        path = str(folder / name)
+        with open(path, 'wb') as strm:
+            strm.write(data)
+        files[path] = data
+    return files
+
+
+def archive_contents(zip_file):
+    with zipfile.ZipFile(zip_file) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+@pytest.mark.parametrize('compression', sorted(log_archive.COMPRESSIONS))
+@pytest.mark.parametrize('parallel', [True, False])
+def test_round_trip(tmp_path, monkeypatch, compression, parallel):
+    if not parallel:
+        monkeypatch.setattr(log_archive, 'can_write_compressed', lambda zf: False)
+    zip_file = str(tmp_path / 'logs.zip')
+
+    first = write_files(tmp_path, ['a.dslog', 'a.dsevents', 'b.dslog'])
+    res = log_archive.archive_files(zip_file, list(first), compression, jobs=2)
+    assert sorted(res.archived) == sorted(first) and res.failed == []
+    assert res.bytes_in == sum(len(data) for data in first.values())
+    if compression != 'stored':
+        assert res.bytes_out < res.bytes_in
+    assert not any(os.path.exists(path) for path in first)
+
+    # appended to the same archive
+    second = write_files(tmp_path, ['c.dslog'], seed=1)
+    res = log_archive.archive_files(zip_file, list(second), compression)
+    assert res.archived == list(second)
+
+    expected = {os.path.basename(path): data for path, data in list(first.items()) + list(second.items())}
+    assert archive_contents(zip_file) == expected
+
+
+def test_duplicates(tmp_path):
+    zip_file = str(tmp_path / 'logs.zip')
+    files = write_files(tmp_path, ['a.dslog', 'b.dslog'])
+    log_archive.archive_files(zip_file, list(files))
+
+    # the same file again is archived without a second copy, a different one with the same name is kept
+    same = write_files(tmp_path, ['a.dslog'])
+    different = write_files(tmp_path, ['b.dslog'], seed=1)
+    res = log_archive.archive_files(zip_file, list(same) + list(different))
+    assert res.archived == list(same)
+    assert [path for path, error in res.failed] == list(different)
+    assert not os.path.exists(list(same)[0]) and os.path.exists(list(different)[0])
+
+    with zipfile.ZipFile(zip_file) as zf:
+        assert sorted(zf.namelist()) == ['a.dslog', 'b.dslog']
+
+
+def test_removed_after_verify(tmp_path, monkeypatch):
+    zip_file = str(tmp_path / 'logs.zip')
+    files = write_files(tmp_path, ['a.dslog', 'b.dslog'])
+    bad = str(tmp_path / 'b.dslog')
+    verify_member = log_archive.verify_member
+
+    def verify(zf, name, size):
+        if name == 'b.dslog':
+            raise zipfile.BadZipFile("Bad CRC-32 for file 'b.dslog'")
+        return verify_member(zf, name, size)
+
+    monkeypatch.setattr(log_archive, 'verify_member', verify)
+    res = log_archive.archive_files(zip_file, list(files))
+    assert res.archived == [str(tmp_path / 'a.dslog')]
+    assert res.failed == [(bad, "Bad CRC-32 for file 'b.dslog'")]
+    assert os.path.exists(bad)
+    assert res.bytes_in == len(files[str(tmp_path / 'a.dslog')])
+
+
+def test_verify_member(tmp_path):
+    zip_file = str(tmp_path / 'logs.zip')
+    files = write_files(tmp_path, ['a.dslog'])
+    log_archive.archive_files(zip_file, list(files), remove=False)
+
+    with zipfile.ZipFile(zip_file) as zf:
+        log_archive.verify_member(zf, 'a.dslog', 20000)
+        with pytest.raises(Exception, match='not 20001'):
+            log_archive.verify_member(zf, 'a.dslog', 20001)
+
+    # flip a byte of the member's data
+    with zipfile.ZipFile(zip_file) as zf:
+        offset = zf.getinfo('a.dslog').header_offset + 30 + len('a.dslog') + 100
+    with open(zip_file, 'r+b') as strm:
+        strm.seek(offset)
+        byte = strm.read(1)
+        strm.seek(offset)
+        strm.write(bytes([byte[0] ^ 0xFF]))
+    with zipfile.ZipFile(zip_file) as zf:
+        with pytest.raises(Exception):
+            log_archive.verify_member(zf, 'a.dslog', 20000)
+
+
+def test_companion_files(tmp_path):
+    files = write_files(tmp_path, ['a.dslog', 'a.dsevents', 'b.dslog', 'b.dsevents', 'c.dslog'])
+    a_log, a_events, b_log, b_events, c_log = files
+    # the event files come after their logs, once, and only if they exist
+    assert log_archive.companion_files([a_log, b_events, b_log, c_log]) == [a_log, a_events, b_events, b_log, c_log]
+
+
+def test_nothing_archived(tmp_path):
+    zip_file = str(tmp_path / 'logs.zip')
+    missing = str(tmp_path / 'missing.dslog')
+    res = log_archive.archive_files(zip_file, [missing])
+    assert res.archived == [] and [path for path, error in res.failed] == [missing]
+    assert not os.path.exists(zip_file)
+
+
+@pytest.mark.parametrize('compression, level', [('bz2', 0), ('deflate', 10), ('deflate', -1), ('zstd', 6)])
+def test_bad_level(tmp_path, compression, level):
+    zip_file = str(tmp_path / 'logs.zip')
+    files = write_files(tmp_path, ['a.dslog'])
+    with pytest.raises(Exception, match=compression):
+        log_archive.archive_files(zip_file, list(files), compression, level)
+    assert not os.path.exists(zip_file)
+    assert all(os.path.exists(path) for path in files)
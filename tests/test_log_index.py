@@ -0,0 +1,24 @@
+import shutil
+
+import log_index
+from test_decode import write_log
+
+
+def test_update_files(tmp_path):
+    log_dir = str(tmp_path) + '/'
+    write_log(tmp_path / 'a.dslog', 100)
+    # an event file with no events
+    (tmp_path / 'a.dsevents').write_bytes(b'\x00\x00\x00\x03' + b'\x00' * 16)
+    # a log the Driver Station has only started to write
+    (tmp_path / 'b.dslog').write_bytes(b'\x00\x00\x00\x03' + b'\x00' * 8)
+    shutil.copy(tmp_path / 'a.dsevents', tmp_path / 'b.dsevents')
+
+    index = log_index.LogIndex(str(tmp_path / 'index.json'))
+    updates = index.update_files(log_dir, ['a.dslog', 'b.dslog', 'c.dslog'])
+    assert updates['a.dslog']['records'] == 100
+    assert updates['b.dslog'] is None
+    assert updates['c.dslog'] is None
+
+    # finished now
+    write_log(tmp_path / 'b.dslog', 50)
+    assert index.update_files(log_dir, ['b.dslog'])['b.dslog']['records'] == 50
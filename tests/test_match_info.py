@@ -0,0 +1,82 @@
+# find_match_info walks the record lengths of the event file instead of decoding every event, and must find
+# exactly what decoding every event and matching the first 'FMS Connected:' message finds.
+
+import random
+import struct
+
+import pytest
+
+import dslog2csv
+from test_decode import START, event_time, write_events
+
+MATCH = 'FMS Connected:   Qualification - 12:1, Field Time: 18/12/3 0:2:3'
+
+
+def reference(event_file):
+    dsparser = dslog2csv.DSEventParser(event_file)
+    try:
+        for _, text in dsparser.read_records():
+            m = dslog2csv.FMS_CONNECTED_RE.match(text)
+            if m:
+                return m.group('info')
+        return None
+    finally:
+        dsparser.close()
+
+
+def random_events(rnd, count):
+    messages = [
+        '<TagVersion>1 <time> 1.000 <message> Warning <code> 44004 <details> lost communication',
+        '<TagVersion>1 <time> 2.000 <message> FMS Connected: in the middle of a message',
+        'FMS Connected:',
+        'FMS Connected:no space',
+        'xFMS Connected:   Practice - 1:1',
+        'FMS Disconnected',
+        '',
+    ]
+    # real ones are rare, so some files have none
+    events = [(i * 0.1, rnd.choice(messages)) for i in range(count)]
+    for i in range(count):
+        if rnd.random() < 0.01:
+            events[i] = (i * 0.1, 'FMS Connected:   Elimination - {}:1'.format(i))
+    # a length or time stamp with the marker's bytes in it turns up now and again too
+    for _ in range(rnd.randint(0, 3)):
+        events.insert(rnd.randrange(len(events) + 1), (1.0, 'FMS Connected:' * rnd.randint(1, 3)))
+    return events
+
+
+@pytest.mark.parametrize('events', [
+    [],
+    [(0.0, MATCH)],
+    [(0.0, 'FMS Connected:'), (0.5, 'no FMS Connected:   here'), (1.0, MATCH)],
+    [(i * 0.02, '<message> Warning {}'.format(i)) for i in range(500)] + [(10.0, MATCH)],
+    [(i * 0.02, '<message> Warning {}'.format(i)) for i in range(500)],
+])
+def test_find_match_info(tmp_path, events):
+    event_file = str(write_events(tmp_path / 'test.dsevents', events))
+    assert dslog2csv.find_match_info(event_file) == reference(event_file)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_find_match_info_random(tmp_path, seed):
+    rnd = random.Random(seed)
+    event_file = str(write_events(tmp_path / 'test.dsevents', random_events(rnd, rnd.randint(0, 200))))
+    expected = reference(event_file)
+    assert dslog2csv.find_match_info(event_file) == expected
+    with open(event_file, 'rb') as strm:
+        assert dslog2csv.scan_match_info(strm.read()) == expected
+
+
+def test_marker_in_time_stamp():
+    # the marker in the time stamp and length of an event is not the start of a message
+    fake = b'FMS Connected:\x00\x00' + struct.pack('>i', 6) + b'   Bad'
+    real = MATCH.encode('ascii')
+    data = struct.pack('>i', 3) + START + fake + event_time(1.0) + struct.pack('>i', len(real)) + real
+    assert dslog2csv.scan_match_info(data) == 'Qualification - 12:1, Field Time: 18/12/3 0:2:3'
+
+
+def test_bad_files():
+    with pytest.raises(Exception, match='too short'):
+        dslog2csv.scan_match_info(b'\x00\x00')
+    with pytest.raises(Exception, match='version'):
+        dslog2csv.scan_match_info(struct.pack('>i', 4) + START)
@@ -0,0 +1,103 @@
+# merged_rows reads the log and its events once, in step, and must place every event exactly where looking at all
+# the records for each event would.
+
+import random
+
+import pytest
+
+import dslog2csv
+import dslog_events
+from test_decode import write_log, write_events
+
+RECORDS = 300
+
+MESSAGES = [
+    '<TagVersion>1 <time> 0.100 <message> Warning, "quoted" <code> 44004 <details> lost communication',
+    '<TagVersion>1 <time> 0.200 <message> Info <code> 1',
+    'plain, text',
+    'two\nlines',
+    '',
+]
+
+
+@pytest.fixture(params=[0, 1])
+def logs(tmp_path, request):
+    """A log, and its events as (hundredths of a second after the start, message) with some before and after the
+    log, several on one record and some exactly half way between the records in a mode"""
+
+    rnd = random.Random(request.param)
+    log_file = str(write_log(tmp_path / 'a.dslog', RECORDS, seed=request.param))
+    with dslog2csv.DSLogParser(log_file) as dsparser:
+        rows = list(dsparser.read_rows(text=True))
+    tele = [i for i, row in enumerate(rows) if row[dslog2csv.DSLogParser.OUTPUT_COLUMNS.index('robot_tele')] == 'True']
+
+    # the records are 2 hundredths apart
+    times = [rnd.randint(-50, 2 * RECORDS + 50) for _ in range(100)]
+    times += [100] * 4 + [tele[k] + tele[k + 1] for k in range(0, len(tele) - 1, 10)]
+    events = [(h, rnd.choice(MESSAGES)) for h in sorted(times)]
+    event_file = str(write_events(tmp_path / 'a.dsevents', [(h / 100, message) for h, message in events]))
+    return log_file, event_file, rows, events
+
+
+def reference(event_file, rows, events, how, record_filter):
+    """The merged rows, placing each event by looking at every record"""
+
+    names = dslog2csv.DSLogParser.OUTPUT_COLUMNS
+    if record_filter.columns is None:
+        indices = range(len(names))
+    else:
+        indices = [i for i, name in enumerate(names) if name in record_filter.columns]
+    first = 0 if record_filter.start is None else -(-round(record_filter.start * 100) // 2)
+    last = float('inf') if record_filter.end is None else -(-round(record_filter.end * 100) // 2)
+    kept = [i for i in range(first, min(last, RECORDS)) if record_filter.mode is None
+            or rows[i][names.index(dslog2csv.MODE_COLUMNS[record_filter.mode])] == 'True']
+
+    rdr = dslog2csv.DSEventParser(event_file)
+    decoded = [dslog_events.decode_event(t, text) for t, text in rdr.read_records()]
+    rdr.close()
+    # where each event falls among the records, without an end the ones after the log are kept
+    placed = [(h / 2, e) for (h, _), e in zip(events, decoded) if first <= h / 2 < last]
+
+    def record_row(i, evs):
+        row = tuple(rows[i][k] for k in indices)
+        if not evs:
+            return row + ('', '')
+        return row + (' | '.join(e.type for e in evs), dslog2csv.csv_quote(' | '.join(e.message for e in evs)))
+
+    if how == 'rows':
+        items = [((i, 0, 0), record_row(i, [])) for i in kept]
+        for n, (offset, e) in enumerate(placed):
+            row = tuple(str(e.time) if names[k] == 'time' else '' for k in indices)
+            items.append(((offset, 1, n), row + (e.type, dslog2csv.csv_quote(e.message))))
+        return [row for _, row in sorted(items, key=lambda item: item[0])]
+
+    attached = {i: [] for i in kept}
+    for offset, e in placed:
+        if kept:
+            # the nearest record, the earlier one on a tie
+            attached[min(kept, key=lambda i: (abs(offset - i), i))].append(e)
+    return [record_row(i, attached[i]) for i in kept]
+
+
+@pytest.mark.parametrize('how', dslog2csv.MERGE_EVENTS)
+@pytest.mark.parametrize('record_filter', [
+    dslog2csv.RecordFilter(),
+    dslog2csv.RecordFilter(start=1.01, end=4.5),
+    dslog2csv.RecordFilter(mode='tele'),
+    dslog2csv.RecordFilter(mode='auto', start=0.5),
+    dslog2csv.RecordFilter(columns=['voltage', 'robot_tele']),
+    dslog2csv.RecordFilter(columns=['time', 'pdp_3'], mode='tele', end=5.0),
+    dslog2csv.RecordFilter(start=10.0),
+])
+def test_merged_rows(logs, how, record_filter):
+    log_file, event_file, rows, events = logs
+    expected = reference(event_file, rows, events, how, record_filter)
+    with dslog2csv.DSLogParser(log_file) as dsparser:
+        assert list(dslog2csv.merged_rows(dsparser, event_file, how, record_filter)) == expected
+
+
+@pytest.mark.parametrize('how', dslog2csv.MERGE_EVENTS)
+def test_no_events(logs, how):
+    log_file, event_file, rows, events = logs
+    with dslog2csv.DSLogParser(log_file) as dsparser:
+        assert list(dslog2csv.merged_rows(dsparser, None, how)) == [row + ('', '') for row in rows]
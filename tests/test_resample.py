@@ -0,0 +1,146 @@
+# The Resampler only keeps the open window between chunks, and must give the same windows as aggregating all the
+# records at once, wherever the chunks happen to end.
+
+import random
+
+import pytest
+
+import dslog2csv
+import dslog_resample
+from test_decode import write_log, reference, record_values
+
+numpy = pytest.importorskip('numpy')
+
+RECORDS = 2000
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """A log of random records, with the status bits kept for runs of records, so a mode lasts a while"""
+
+    path = str(write_log(tmp_path / 'test.dslog', RECORDS))
+    with open(path, 'rb') as strm:
+        data = bytearray(strm.read())
+    rnd = random.Random(1)
+    size = dslog2csv.DSLogParser.RECORD_SIZE
+    i = 0
+    while i < RECORDS:
+        run = rnd.randint(1, 60)
+        status = data[dslog2csv.DSLogParser.HEADER_SIZE + i * size + 5]
+        for j in range(i, min(i + run, RECORDS)):
+            data[dslog2csv.DSLogParser.HEADER_SIZE + j * size + 5] = status
+        i += run
+    with open(path, 'wb') as strm:
+        strm.write(data)
+    return path
+
+
+def resample_reference(records, indices, window, agg, status_agg):
+    """The windows of (record number, record) pairs, aggregating each window's records all at once"""
+
+    def key(i, rec):
+        if window == 'mode':
+            return rec['robot_auto'], rec['robot_tele']
+        return i // window
+
+    groups = []
+    for i, rec in zip(indices, records):
+        # in mode windows, records filtered out in between end a window too
+        if groups and key(i, rec) == key(*groups[-1][-1]) and (window != 'mode' or i == groups[-1][-1][0] + 1):
+            groups[-1].append((i, rec))
+        else:
+            groups.append([(i, rec)])
+
+    res = []
+    for group in groups:
+        recs = [rec for _, rec in group]
+        row = {'time': recs[0]['time'], 'pdp_id': recs[-1]['pdp_id'], 'records': len(recs)}
+        for name in dslog2csv.DSLogParser.OUTPUT_COLUMNS[1:]:
+            values = [record_values(rec, name) for rec in recs]
+            if name in dslog2csv.STATUS_COLUMNS:
+                row[name] = any(values) if status_agg == 'any' else all(values)
+            elif name != 'pdp_id':
+                row[name] = {'mean': sum(values) / len(values), 'min': min(values), 'max': max(values),
+                             'last': values[-1]}[agg]
+        res.append(row)
+    return res
+
+
+def assert_windows_match(cols, expected):
+    assert len(cols['time']) == len(expected)
+    assert cols['time'].astype('datetime64[us]').tolist() == [row['time'].replace(tzinfo=None) for row in expected]
+    for name in expected[0]:
+        if name == 'time':
+            continue
+        values = [row[name] for row in expected]
+        if cols[name].dtype.kind == 'f':
+            assert numpy.allclose(cols[name], values), name
+        else:
+            assert cols[name].tolist() == values, name
+
+
+@pytest.mark.parametrize('window', [1, 5, 7, 50, 'mode'])
+@pytest.mark.parametrize('agg', dslog_resample.RESAMPLE_AGGREGATES)
+@pytest.mark.parametrize('status_agg, mode', [('any', None), ('all', 'tele')])
+def test_chunks(log_file, window, agg, status_agg, mode):
+    records = reference(log_file)
+    indices = range(len(records))
+    if mode is not None:
+        column = dslog2csv.MODE_COLUMNS[mode]
+        indices = [i for i in indices if records[i][column]]
+    expected = resample_reference([records[i] for i in indices], indices, window, agg, status_agg)
+
+    # in chunks of all sizes, down to single records, so windows are carried over every way
+    rnd = random.Random(0)
+    resampler = dslog_resample.Resampler(window, agg, status_agg)
+    windows = []
+    index = 0
+    with dslog2csv.DSLogParser(log_file) as dsparser:
+        while index < RECORDS:
+            cols = dsparser.read_columns(rnd.choice([1, 2, 3, 17, 64, 101]))
+            chunk_indices = numpy.arange(index, index + len(cols['time']))
+            index += len(cols['time'])
+            if mode is not None:
+                keep = cols[column]
+                cols = {name: values[keep] for name, values in cols.items()}
+                chunk_indices = chunk_indices[keep]
+            windows.append(resampler.add(cols, chunk_indices))
+    windows.append(resampler.finish())
+    assert resampler.finish() is None
+
+    windows = [cols for cols in windows if cols is not None]
+    assert_windows_match({name: numpy.concatenate([cols[name] for cols in windows]) for name in windows[0]}, expected)
+
+
+class ColumnsWriter:
+    columnar = True
+
+    def __init__(self):
+        self.chunks = []
+
+    def write_columns(self, cols):
+        self.chunks.append(cols)
+
+
+@pytest.mark.parametrize('window', [7, 'mode'])
+def test_write_log(log_file, monkeypatch, window):
+    monkeypatch.setattr(dslog2csv, 'COLUMN_CHUNK_SIZE', 37)
+    record_filter = dslog2csv.RecordFilter(start=3.3, end=30.0, mode='auto')
+    records = reference(log_file)
+    indices = [i for i in range(165, 1500) if records[i]['robot_auto']]
+    expected = resample_reference([records[i] for i in indices], indices, window, 'max', 'all')
+
+    writer = ColumnsWriter()
+    resampler = dslog_resample.Resampler(window, 'max', 'all')
+    assert dslog2csv.write_log(log_file, writer, record_filter=record_filter, resampler=resampler) == len(expected)
+    assert_windows_match({name: numpy.concatenate([cols[name] for cols in writer.chunks]) for name in expected[0]},
+                         expected)
+
+
+def test_parse_window():
+    assert dslog_resample.parse_window('100ms') == 5
+    assert dslog_resample.parse_window('1s') == 50
+    assert dslog_resample.parse_window('1ms') == 1
+    assert dslog_resample.parse_window('mode') == 'mode'
+    with pytest.raises(Exception, match='window'):
+        dslog_resample.parse_window('1 minute')